@@ -1,101 +1,486 @@
+import asyncio
+import os
 import sqlite3
 import json
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
+
+# O'qish uchun ulanishlar (thread'lar) soni
+DB_READERS = int(os.getenv("DB_READERS", "4"))
+# Shu oraliqda (soniya) kelgan yozuvlar bitta tranzaksiyada commit qilinadi
+DB_COMMIT_WINDOW = float(os.getenv("DB_COMMIT_WINDOW", "0.01"))
+# get_bot keshi: nechta yozuv saqlanadi va necha soniya yaroqli
+BOT_CACHE_SIZE = int(os.getenv("BOT_CACHE_SIZE", "1024"))
+BOT_CACHE_TTL = float(os.getenv("BOT_CACHE_TTL", "60"))
+
+def _create_tables(conn):
+    """asosiy jadvallar"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER UNIQUE,
+            username TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            owner_id INTEGER,
+            name TEXT,
+            token TEXT,
+            status TEXT DEFAULT 'stopped',
+            path TEXT,
+            env_vars TEXT DEFAULT '{}',
+            FOREIGN KEY (owner_id) REFERENCES users (telegram_id)
+        )
+    """)
+
+def _add_bot_indexes(conn):
+    """bots jadvali indekslari (owner_id, status, unique(owner_id, name))"""
+    # Bir egasidagi bir xil nomli botlar nomiga id qo'shiladi, aks holda unique indeks yaratilmaydi
+    conn.execute("""
+        UPDATE bots SET name = name || ' (' || id || ')'
+        WHERE id NOT IN (SELECT MIN(id) FROM bots GROUP BY owner_id, name)
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bots_owner ON bots (owner_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bots_status ON bots (status)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_bots_owner_name ON bots (owner_id, name)")
+
+def _add_bot_env(conn):
+    """bot_env jadvali (bots.env_vars JSON'idan ko'chiriladi)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bot_env (
+            bot_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (bot_id, key)
+        ) WITHOUT ROWID
+    """)
+    for bot_id, env_json in conn.execute("SELECT id, env_vars FROM bots").fetchall():
+        try:
+            env_vars = json.loads(env_json) if env_json else {}
+        except ValueError:
+            continue
+        if isinstance(env_vars, dict):
+            conn.executemany("INSERT OR REPLACE INTO bot_env (bot_id, key, value) VALUES (?, ?, ?)",
+                             [(bot_id, str(k), str(v)) for k, v in env_vars.items()])
+    # Eski ustun SQLite'da o'chirilmaydi, faqat endi ishlatilmaydi
+    conn.execute("UPDATE bots SET env_vars = '{}'")
+
+def _add_bot_pid(conn):
+    """bots.pid va bots.pid_start (qayta ishga tushganda jarayonni qabul qilish uchun)"""
+    conn.execute("ALTER TABLE bots ADD COLUMN pid INTEGER")
+    conn.execute("ALTER TABLE bots ADD COLUMN pid_start INTEGER")
+
+def _add_bot_limits(conn):
+    """bots jadvaliga resurs cheklovlari ustunlari (NULL - standart qiymat)"""
+    for column in ("memory_mb", "cpu_percent", "max_files", "max_procs"):
+        conn.execute(f"ALTER TABLE bots ADD COLUMN {column} INTEGER")
+
+# Migratsiyalar tartibi o'zgarmasligi kerak: N-element bazani N-versiyaga o'tkazadi
+MIGRATIONS = [
+    _create_tables,
+    _add_bot_indexes,
+    _add_bot_env,
+    _add_bot_pid,
+    _add_bot_limits,
+]
+
+class BotRecord:
+    """bots jadvalidagi bitta qator"""
+    __slots__ = ("id", "owner_id", "name", "token", "status", "path", "pid", "pid_start",
+                 "memory_mb", "cpu_percent", "max_files", "max_procs")
+
+    def __init__(self, id, owner_id, name, token, status, path, pid=None, pid_start=None,
+                 memory_mb=None, cpu_percent=None, max_files=None, max_procs=None):
+        self.id = id
+        self.owner_id = owner_id
+        self.name = name
+        self.token = token
+        self.status = status
+        self.path = path
+        self.pid = pid  # ishlayotgan jarayon PID'i va uning boshlanish vaqti (/proc, tick'larda)
+        self.pid_start = pid_start
+        # Resurs cheklovlari (None - standart qiymat, 0 - cheklanmagan)
+        self.memory_mb = memory_mb
+        self.cpu_percent = cpu_percent
+        self.max_files = max_files
+        self.max_procs = max_procs
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row) if row else None
+
+    def __repr__(self):
+        return f"BotRecord(id={self.id}, owner_id={self.owner_id}, name={self.name!r}, status={self.status!r})"
+
+BOT_COLUMNS = ("id, owner_id, name, token, status, path, pid, pid_start, "
+               "memory_mb, cpu_percent, max_files, max_procs")
+LIMIT_COLUMNS = ("memory_mb", "cpu_percent", "max_files", "max_procs")
+
+class BotCache:
+    """Botlar bo'yicha ma'lumotlar (yozuv, env) uchun LRU + TTL kesh.
+
+    Har bir invalidatsiya avlod (generation) hisoblagichini oshiradi: o'qish boshlanganidan
+    keyin yozuv bo'lgan bo'lsa, o'qilgan (eskirgan bo'lishi mumkin) natija keshga qo'yilmaydi.
+    """
+
+    def __init__(self, size=BOT_CACHE_SIZE, ttl=BOT_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.items = OrderedDict()  # bot_id: (muddati, BotRecord)
+        self.generation = 0
+
+    def get(self, bot_id):
+        item = self.items.get(bot_id)
+        if item is None:
+            return None
+        expires, record = item
+        if expires < time.monotonic():
+            del self.items[bot_id]
+            return None
+        self.items.move_to_end(bot_id)
+        return record
+
+    def put(self, bot_id, record, generation):
+        if generation != self.generation or self.size <= 0:
+            return
+        self.items[bot_id] = (time.monotonic() + self.ttl, record)
+        self.items.move_to_end(bot_id)
+        while len(self.items) > self.size:
+            self.items.popitem(last=False)
+
+    def invalidate(self, bot_id=None):
+        self.generation += 1
+        if bot_id is None:
+            self.items.clear()
+        else:
+            self.items.pop(bot_id, None)
 
 class Database:
-    def __init__(self, db_name="hosting.db"):
-        self.conn = sqlite3.connect(db_name, check_same_thread=False)
-        self.cursor = self.conn.cursor()
-        self.create_tables()
-
-    def create_tables(self):
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                telegram_id INTEGER UNIQUE,
-                username TEXT
-            )
-        """)
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS bots (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                owner_id INTEGER,
-                name TEXT,
-                token TEXT,
-                status TEXT DEFAULT 'stopped',
-                path TEXT,
-                env_vars TEXT DEFAULT '{}',
-                FOREIGN KEY (owner_id) REFERENCES users (telegram_id)
-            )
-        """)
-        self.conn.commit()
-
-    def add_user(self, telegram_id, username):
-        try:
-            self.cursor.execute("INSERT OR IGNORE INTO users (telegram_id, username) VALUES (?, ?)", (telegram_id, username))
+    """SQLite bilan asinxron ishlash qatlami.
+
+    Baza WAL rejimida ochiladi: barcha yozuvlar bitta alohida thread'dagi yagona ulanish
+    orqali, o'qishlar esa har biri o'z ulanishiga ega bo'lgan thread'lar to'plamida
+    bajariladi. Shuning uchun hech bir so'rov event loop'ni bloklamaydi.
+
+    Yozuvlar darhol bajarilmaydi: DB_COMMIT_WINDOW ichida kelganlari to'planib, bitta
+    tranzaksiyada (bitta fsync bilan) commit qilinadi. Har bir yozuv o'z SAVEPOINT'ida
+    bajariladi, shuning uchun bittasining xatosi qolganlariga ta'sir qilmaydi. Yozish
+    metodlari `wait=False` bilan chaqirilsa, commit kutilmaydi.
+
+    get_bot va get_env_vars natijalari BotCache'larda saqlanadi; botni o'zgartiruvchi har
+    bir yozuv keshni navbatga qo'yilganda ham, commit bo'lganda ham tozalaydi.
+    """
+
+    def __init__(self, db_name="hosting.db", readers=DB_READERS):
+        self.db_name = db_name
+        self.conn = self._connect()
+        self.migrate()
+        self._local = threading.local()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(max_workers=max(1, readers), thread_name_prefix="db-reader")
+        self._pending = []  # (query, future) - keyingi commit'ni kutayotgan yozuvlar
+        self._flush_handle = None
+        self._batches = set()
+        self.bot_cache = BotCache()
+        self.env_cache = BotCache()
+
+    def _connect(self, read_only=False):
+        conn = sqlite3.connect(self.db_name, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if read_only:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _reader_conn(self):
+        # Har bir o'qish thread'ining o'z ulanishi bor
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect(read_only=True)
+        return conn
+
+    async def _read(self, query):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, lambda: query(self._reader_conn()))
+
+    async def _write(self, query, wait=True, bot_id=None):
+        """Yozuvni navbatga qo'yadi. wait=True bo'lsa commit bo'lishini kutib natijani qaytaradi.
+
+        bot_id berilsa, shu botning kesh yozuvlari yaroqsiz deb belgilanadi.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, future))
+        if bot_id is not None:
+            self._invalidate_bot(bot_id)
+            future.add_done_callback(lambda _: self._invalidate_bot(bot_id))
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(DB_COMMIT_WINDOW, self._flush_batch)
+        if wait:
+            return await future
+        future.add_done_callback(self._report_write_error)
+
+    def _invalidate_bot(self, bot_id):
+        self.bot_cache.invalidate(bot_id)
+        self.env_cache.invalidate(bot_id)
+
+    def _report_write_error(self, future):
+        if not future.cancelled() and future.exception():
+            print(f"Yozuv xatosi: {future.exception()}")
+
+    def _flush_batch(self):
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return None
+        task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+        return task
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self._writer, self._commit_batch, [q for q, _ in batch])
+        except Exception as e:
+            results = [(False, e)] * len(batch)
+        for (_, future), (ok, value) in zip(batch, results):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def _commit_batch(self, queries):
+        """Yozuvlar to'plamini bitta tranzaksiyada bajaradi (writer thread'ida)"""
+        results = []
+        self.conn.execute("BEGIN")
+        try:
+            for query in queries:
+                self.conn.execute("SAVEPOINT write_op")
+                try:
+                    results.append((True, query(self.conn)))
+                except Exception as e:
+                    self.conn.execute("ROLLBACK TO write_op")
+                    results.append((False, e))
+                self.conn.execute("RELEASE write_op")
             self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return results
+
+    async def flush(self):
+        """Navbatdagi barcha yozuvlarni darhol commit qiladi"""
+        task = self._flush_batch()
+        if task:
+            await task
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+
+    async def close(self):
+        await self.flush()
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        self.conn.close()
+
+    def migrate(self):
+        """Bazani PRAGMA user_version bo'yicha eng so'nggi sxemaga olib keladi"""
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            self.conn.execute("BEGIN")
+            try:
+                migration(self.conn)
+                self.conn.execute(f"PRAGMA user_version = {number}")
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            print(f"📊 Baza {number}-versiyaga yangilandi: {migration.__doc__}")
+
+    async def add_user(self, telegram_id, username, wait=True):
+        def query(conn):
+            conn.execute("INSERT OR IGNORE INTO users (telegram_id, username) VALUES (?, ?)", (telegram_id, username))
+        try:
+            await self._write(query, wait)
         except Exception as e:
             print(f"add_user xatosi: {e}")
 
-    def add_bot(self, owner_id, name, token, path):
+    async def add_bot(self, owner_id, name, token, path):
+        def query(conn):
+            cursor = conn.execute("INSERT INTO bots (owner_id, name, token, path) VALUES (?, ?, ?, ?)",
+                                  (owner_id, name, token, path))
+            return cursor.lastrowid
         try:
-            self.cursor.execute("INSERT INTO bots (owner_id, name, token, path) VALUES (?, ?, ?, ?)", 
-                              (owner_id, name, token, path))
-            self.conn.commit()
-            return self.cursor.lastrowid
+            return await self._write(query)
         except Exception as e:
             print(f"add_bot xatosi: {e}")
             return None
 
-    def get_user_bots(self, owner_id):
+    async def get_user_bots(self, owner_id):
         try:
-            self.cursor.execute("SELECT * FROM bots WHERE owner_id = ?", (owner_id,))
-            return self.cursor.fetchall()
+            rows = await self._read(
+                lambda conn: conn.execute(f"SELECT {BOT_COLUMNS} FROM bots WHERE owner_id = ?", (owner_id,)).fetchall())
+            return [BotRecord.from_row(row) for row in rows]
         except Exception as e:
             print(f"get_user_bots xatosi: {e}")
             return []
 
-    def get_bot(self, bot_id):
+    async def get_user_bot_by_name(self, owner_id, name):
         try:
-            self.cursor.execute("SELECT * FROM bots WHERE id = ?", (bot_id,))
-            return self.cursor.fetchone()
+            row = await self._read(
+                lambda conn: conn.execute(f"SELECT {BOT_COLUMNS} FROM bots WHERE owner_id = ? AND name = ?",
+                                          (owner_id, name)).fetchone())
+            return BotRecord.from_row(row)
+        except Exception as e:
+            print(f"get_user_bot_by_name xatosi: {e}")
+            return None
+
+    async def get_bot(self, bot_id):
+        record = self.bot_cache.get(bot_id)
+        if record is not None:
+            return record
+        generation = self.bot_cache.generation
+        try:
+            row = await self._read(
+                lambda conn: conn.execute(f"SELECT {BOT_COLUMNS} FROM bots WHERE id = ?", (bot_id,)).fetchone())
+            record = BotRecord.from_row(row)
+            if record is not None:
+                self.bot_cache.put(bot_id, record, generation)
+            return record
         except Exception as e:
             print(f"get_bot xatosi: {e}")
             return None
 
-    def update_bot_status(self, bot_id, status):
+    async def update_bot_status(self, bot_id, status, pid=None, pid_start=None, wait=True):
+        def query(conn):
+            conn.execute("UPDATE bots SET status = ?, pid = ?, pid_start = ? WHERE id = ?",
+                         (status, pid, pid_start, bot_id))
         try:
-            self.cursor.execute("UPDATE bots SET status = ? WHERE id = ?", (status, bot_id))
-            self.conn.commit()
+            await self._write(query, wait, bot_id=bot_id)
         except Exception as e:
             print(f"update_bot_status xatosi: {e}")
 
-    def delete_bot(self, bot_id):
+    async def set_bot_limit(self, bot_id, column, value, wait=True):
+        """Bitta cheklovni o'rnatadi (value=None - standart qiymatga qaytarish)"""
+        if column not in LIMIT_COLUMNS:
+            raise ValueError(f"Noma'lum cheklov: {column}")
+        def query(conn):
+            conn.execute(f"UPDATE bots SET {column} = ? WHERE id = ?", (value, bot_id))
         try:
-            self.cursor.execute("DELETE FROM bots WHERE id = ?", (bot_id,))
-            self.conn.commit()
+            await self._write(query, wait, bot_id=bot_id)
+        except Exception as e:
+            print(f"set_bot_limit xatosi: {e}")
+
+    async def get_bots_by_status(self, statuses):
+        placeholders = ", ".join("?" * len(statuses))
+        try:
+            rows = await self._read(
+                lambda conn: conn.execute(f"SELECT {BOT_COLUMNS} FROM bots WHERE status IN ({placeholders})",
+                                          tuple(statuses)).fetchall())
+            return [BotRecord.from_row(row) for row in rows]
+        except Exception as e:
+            print(f"get_bots_by_status xatosi: {e}")
+            return []
+
+    async def delete_bot(self, bot_id, wait=True):
+        def query(conn):
+            conn.execute("DELETE FROM bot_env WHERE bot_id = ?", (bot_id,))
+            conn.execute("DELETE FROM bots WHERE id = ?", (bot_id,))
+        try:
+            await self._write(query, wait, bot_id=bot_id)
         except Exception as e:
             print(f"delete_bot xatosi: {e}")
 
-    def update_env_vars(self, bot_id, env_vars):
+    async def get_env_vars(self, bot_id):
+        """Botning env o'zgaruvchilari (faqat o'qish uchun mapping, keshlanadi)"""
+        env_vars = self.env_cache.get(bot_id)
+        if env_vars is not None:
+            return env_vars
+        generation = self.env_cache.generation
         try:
-            self.cursor.execute("UPDATE bots SET env_vars = ? WHERE id = ?", 
-                              (json.dumps(env_vars), bot_id))
-            self.conn.commit()
+            rows = await self._read(
+                lambda conn: conn.execute("SELECT key, value FROM bot_env WHERE bot_id = ? ORDER BY key",
+                                          (bot_id,)).fetchall())
+            env_vars = MappingProxyType(dict(rows))
+            self.env_cache.put(bot_id, env_vars, generation)
+            return env_vars
+        except Exception as e:
+            print(f"get_env_vars xatosi: {e}")
+            return MappingProxyType({})
+
+    async def set_env_var(self, bot_id, key, value, wait=True):
+        def query(conn):
+            conn.execute("""
+                INSERT INTO bot_env (bot_id, key, value) VALUES (?, ?, ?)
+                ON CONFLICT (bot_id, key) DO UPDATE SET value = excluded.value
+            """, (bot_id, key, value))
+        try:
+            await self._write(query, wait, bot_id=bot_id)
+        except Exception as e:
+            print(f"set_env_var xatosi: {e}")
+
+    async def delete_env_var(self, bot_id, key, wait=True):
+        def query(conn):
+            return conn.execute("DELETE FROM bot_env WHERE bot_id = ? AND key = ?", (bot_id, key)).rowcount > 0
+        try:
+            return await self._write(query, wait, bot_id=bot_id)
         except Exception as e:
-            print(f"update_env_vars xatosi: {e}")
+            print(f"delete_env_var xatosi: {e}")
+            return False
 
-    def get_all_users(self):
+    def _page_query(self, conn, select, after_id, before_id, limit):
+        """Keyset sahifa: id > after_id (oldinga) yoki id < before_id (orqaga).
+
+        Qatorlar id bo'yicha o'sish tartibida, ikkinchi qiymat esa harakat yo'nalishida
+        yana qatorlar bor-yo'qligini bildiradi.
+        """
+        if before_id is not None:
+            rows = conn.execute(f"{select} WHERE id < ? ORDER BY id DESC LIMIT ?",
+                                (before_id, limit + 1)).fetchall()
+            return list(reversed(rows[:limit])), len(rows) > limit
+        rows = conn.execute(f"{select} WHERE id > ? ORDER BY id LIMIT ?",
+                            (after_id or 0, limit + 1)).fetchall()
+        return rows[:limit], len(rows) > limit
+
+    async def get_users_page(self, after_id=None, before_id=None, limit=20):
+        try:
+            return await self._read(
+                lambda conn: self._page_query(conn, "SELECT id, telegram_id, username FROM users",
+                                              after_id, before_id, limit))
+        except Exception as e:
+            print(f"get_users_page xatosi: {e}")
+            return [], False
+
+    async def get_bots_page(self, after_id=None, before_id=None, limit=20):
         try:
-            self.cursor.execute("SELECT * FROM users")
-            return self.cursor.fetchall()
+            rows, more = await self._read(
+                lambda conn: self._page_query(conn, f"SELECT {BOT_COLUMNS} FROM bots",
+                                              after_id, before_id, limit))
+            return [BotRecord.from_row(row) for row in rows], more
+        except Exception as e:
+            print(f"get_bots_page xatosi: {e}")
+            return [], False
+
+    async def get_all_users(self):
+        try:
+            return await self._read(lambda conn: conn.execute("SELECT * FROM users").fetchall())
         except Exception as e:
             print(f"get_all_users xatosi: {e}")
             return []
 
-    def get_all_bots(self):
+    async def get_all_bots(self):
         try:
-            self.cursor.execute("SELECT * FROM bots")
-            return self.cursor.fetchall()
+            rows = await self._read(lambda conn: conn.execute(f"SELECT {BOT_COLUMNS} FROM bots").fetchall())
+            return [BotRecord.from_row(row) for row in rows]
         except Exception as e:
             print(f"get_all_bots xatosi: {e}")
-            return []
\ No newline at end of file
+            return []
@@ -1,8 +1,29 @@
+import argparse
 import ast
+import functools
+import importlib.metadata
+import json
 import os
 import sys
 import subprocess
 import logging
+import sysconfig
+import time
+
+# Per-file import cache stored inside the bot directory
+CACHE_FILE = ".deps_cache.json"
+CACHE_VERSION = 2
+
+# Files to (re)parse before parsing is fanned out to worker processes,
+# and the minimum number of files given to each worker
+PARALLEL_PARSE_THRESHOLD = int(os.getenv("DEPS_PARALLEL_THRESHOLD", "64"))
+PARSE_CHUNK_SIZE = 8
+
+# Directories that never contain the bot's own code
+SKIP_DIRS = {
+    "__pycache__", "site-packages", "dist-packages", "node_modules",
+    ".git", ".venv", "venv", ".tox", ".mypy_cache", ".pytest_cache",
+}
 
 # Mapping of common import names to their pip package names
 IMPORT_TO_PACKAGE = {
@@ -56,55 +77,215 @@ def get_imports_from_file(file_path):
                 for alias in node.names:
                     imports.add(alias.name.split('.')[0])
             elif isinstance(node, ast.ImportFrom):
-                if node.module:
+                # Relative imports always refer to the bot's own modules
+                if node.module and not node.level:
                     imports.add(node.module.split('.')[0])
         return imports
     except Exception as e:
         logging.error(f"Error parsing {file_path}: {e}")
         return set()
 
-def detect_dependencies(bot_dir):
-    """Detect all required packages for a bot directory."""
-    all_imports = set()
-    for root, _, files in os.walk(bot_dir):
+@functools.lru_cache(maxsize=None)
+def stdlib_modules():
+    """Top-level names of the standard library, computed once per interpreter."""
+    names = set(sys.builtin_module_names)
+    if hasattr(sys, "stdlib_module_names"):
+        names.update(sys.stdlib_module_names)
+        return frozenset(names)
+
+    # Python < 3.10: list the stdlib directories once instead of probing per import
+    stdlib_path = sysconfig.get_path('stdlib')
+    for directory in (stdlib_path, os.path.join(stdlib_path, "lib-dynload")):
+        try:
+            entries = os.listdir(directory)
+        except OSError:
+            continue
+        for entry in entries:
+            if entry == "site-packages":
+                continue
+            names.add(entry.split('.')[0])
+    return frozenset(names)
+
+@functools.lru_cache(maxsize=None)
+def distribution_packages():
+    """Map import names to the single installed distribution providing them."""
+    try:
+        mapping = importlib.metadata.packages_distributions()
+    except Exception as e:
+        logging.warning(f"Could not index installed distributions: {e}")
+        return {}
+    return {name: dists[0] for name, dists in mapping.items() if len(set(dists)) == 1}
+
+def is_skipped_dir(root, name):
+    """Return True for caches, installed packages and virtualenvs."""
+    if name in SKIP_DIRS or name.endswith(('.egg-info', '.dist-info')):
+        return True
+    # A virtualenv can have any name, but always has pyvenv.cfg
+    return os.path.exists(os.path.join(root, name, 'pyvenv.cfg'))
+
+def iter_python_files(bot_dir, local_modules=None):
+    """Yield every .py file of the bot, pruning skipped directories.
+
+    If a set is passed as local_modules, the names of the bot's own modules
+    and packages are added to it. Only top-level entries are importable as
+    top-level names (the bot runs from bot_dir), so a nested utils/requests.py
+    does not hide the real requests package.
+    """
+    for root, dirs, files in os.walk(bot_dir):
+        dirs[:] = [d for d in dirs if not is_skipped_dir(root, d)]
+        top_level = local_modules is not None and root == bot_dir
+        if top_level:
+            # Regular and namespace packages
+            local_modules.update(d for d in dirs if d.isidentifier())
         for file in files:
             if file.endswith('.py'):
-                all_imports.update(get_imports_from_file(os.path.join(root, file)))
-    
-    # Filter out standard library modules
-    # We can use a simple list of common stdlib modules
-    # For simplicity, let's use a list of common ones and check if they are in sys.modules
-    # or if they are part of the standard library.
+                if top_level:
+                    local_modules.add(file[:-3])
+                yield os.path.join(root, file)
+
+def load_import_cache(cache_path):
+    """Load the per-file import cache: {relpath: [size, mtime_ns, imports]}."""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") == CACHE_VERSION:
+            return data.get("files", {})
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {}
+
+def save_import_cache(cache_path, files):
+    """Atomically write the per-file import cache."""
+    tmp_path = cache_path + ".tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": CACHE_VERSION, "files": files}, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logging.warning(f"Could not save import cache {cache_path}: {e}")
+
+def parse_files(paths):
+    """Yield (path, imports) for every file, in worker processes for large batches.
+
+    Workers are fresh interpreters running this module with --parse-imports:
+    forking the caller is unsafe when it has threads (the hosting bot calls
+    this from a thread pool), and a multiprocessing spawn/forkserver pool
+    would re-import the caller's __main__ in every worker.
+    """
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    workers = min(cpus, len(paths) // PARSE_CHUNK_SIZE + 1)
+    if len(paths) < PARALLEL_PARSE_THRESHOLD or workers < 2:
+        for path in paths:
+            yield path, get_imports_from_file(path)
+        return
+
+    chunk = -(-len(paths) // workers)
+    batches = []
+    for start in range(0, len(paths), chunk):
+        batch = paths[start:start + chunk]
+        try:
+            proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--parse-imports"],
+                                    stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        except OSError as e:
+            logging.warning(f"Could not start parse worker: {e}")
+            proc = None
+        batches.append((batch, proc))
+
+    # Workers read all of their input before writing, so feeding every worker
+    # first lets them parse in parallel while the results are collected in order
+    for batch, proc in batches:
+        if proc is not None:
+            try:
+                proc.stdin.write(json.dumps(batch).encode('utf-8'))
+                proc.stdin.close()
+            except OSError:
+                pass
+    for batch, proc in batches:
+        results = None
+        if proc is not None:
+            output = proc.stdout.read()
+            proc.stdout.close()
+            try:
+                if proc.wait() == 0:
+                    results = json.loads(output)
+            except ValueError:
+                pass
+        if results is None or len(results) != len(batch):
+            if proc is not None:
+                logging.warning("Parse worker failed, parsing its files in-process")
+            results = [get_imports_from_file(path) for path in batch]
+        for path, imports in zip(batch, results):
+            yield path, set(imports)
+
+def parse_worker():
+    """--parse-imports: read a JSON list of paths from stdin, write their imports as JSON."""
+    paths = json.loads(sys.stdin.buffer.read())
+    json.dump([sorted(get_imports_from_file(path)) for path in paths], sys.stdout)
+
+def collect_imports(bot_dir, use_cache=True, timings=None, local_modules=None):
+    """Collect top-level imports of all bot files, re-parsing only changed ones."""
+    started = time.perf_counter()
+    cache_path = os.path.join(bot_dir, CACHE_FILE)
+    cache = load_import_cache(cache_path) if use_cache else {}
+    files = {}
+    to_parse = {}
+    all_imports = set()
+    for path in iter_python_files(bot_dir, local_modules):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        rel_path = os.path.relpath(path, bot_dir)
+        entry = cache.get(rel_path)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            files[rel_path] = entry
+            all_imports.update(entry[2])
+        else:
+            to_parse[path] = (rel_path, st)
+    walked = time.perf_counter()
+
+    for path, imports in parse_files(list(to_parse)):
+        rel_path, st = to_parse[path]
+        imports = sorted(imports)
+        files[rel_path] = [st.st_size, st.st_mtime_ns, imports]
+        all_imports.update(imports)
+    parsed = time.perf_counter()
+
+    if use_cache and files != cache:
+        save_import_cache(cache_path, files)
+    if timings is not None:
+        timings["walk"] = walked - started
+        timings["parse"] = parsed - walked
+        timings["files"] = len(files)
+        timings["parsed_files"] = len(to_parse)
+    return all_imports
+
+def detect_dependencies(bot_dir, use_cache=True, timings=None):
+    """Detect all required packages for a bot directory.
+
+    If a dict is passed as timings, per-phase durations are stored in it.
+    """
+    local_modules = set()
+    all_imports = collect_imports(bot_dir, use_cache, timings, local_modules)
+    classify_started = time.perf_counter()
     
-    # A better way: check if the module is part of the standard library
-    import sysconfig
-    stdlib_path = sysconfig.get_path('stdlib')
+    # Classification is a set lookup against indexes built once per interpreter
+    stdlib = stdlib_modules()
+    distributions = distribution_packages()
     
     dependencies = []
     for imp in all_imports:
         if imp in IMPORT_TO_PACKAGE:
             dependencies.append(IMPORT_TO_PACKAGE[imp])
+        elif imp in local_modules or imp in stdlib:
+            continue
+        elif imp in distributions:
+            dependencies.append(distributions[imp])
         else:
-            # Check if it's a local file
-            if os.path.exists(os.path.join(bot_dir, f"{imp}.py")) or \
-               os.path.isdir(os.path.join(bot_dir, imp)):
-                continue
-            
-            # Check if it's in stdlib
-            if imp in sys.builtin_module_names:
-                continue
-            
-            # Check if it's in the stdlib directory
-            if os.path.exists(os.path.join(stdlib_path, f"{imp}.py")) or \
-               os.path.isdir(os.path.join(stdlib_path, imp)):
-                continue
-            
-            # Common stdlib modules that might not be caught
-            if imp in ['asyncio', 'json', 'logging', 'os', 'shutil', 'signal', 'sqlite3', 'subprocess', 'sys', 'time', 'ast', 'typing', 'datetime', 'random', 're', 'math']:
-                continue
-                
             dependencies.append(imp)
                 
+    if timings is not None:
+        timings["classify"] = time.perf_counter() - classify_started
     return sorted(list(set(dependencies)))
 
 def install_dependencies(dependencies, log_file=None):
@@ -128,13 +309,26 @@ def install_dependencies(dependencies, log_file=None):
         return False
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python dependency_detector.py <bot_directory>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Detect pip dependencies of a bot directory.")
+    parser.add_argument("bot_directory", nargs="?")
+    parser.add_argument("--timings", action="store_true", help="report time spent per phase")
+    parser.add_argument("--no-cache", action="store_true", help="ignore and do not update the import cache")
+    parser.add_argument("--parse-imports", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.parse_imports:
+        parse_worker()
+        sys.exit(0)
+    if args.bot_directory is None:
+        parser.error("the following arguments are required: bot_directory")
     
-    bot_path = sys.argv[1]
-    deps = detect_dependencies(bot_path)
+    bot_path = args.bot_directory
+    timings = {} if args.timings else None
+    deps = detect_dependencies(bot_path, use_cache=not args.no_cache, timings=timings)
     print(f"Detected dependencies: {deps}")
+    if timings is not None:
+        print(f"Files: {timings['files']} ({timings['parsed_files']} parsed)")
+        for phase in ("walk", "parse", "classify"):
+            print(f"  {phase:<9} {timings[phase] * 1000:8.1f} ms")
     
     req_file = os.path.join(bot_path, "requirements.txt")
     with open(req_file, "w", encoding="utf-8") as f:
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import os
+
+# Bir vaqtda bajariladigan ishga tushirish/o'rnatish vazifalari soni
+START_WORKERS = int(os.getenv("START_WORKERS", "4"))
+
+class JobQueue:
+    """Og'ir vazifalar (botni ishga tushirish, pip install) uchun navbat va cheklangan worker'lar to'plami"""
+
+    def __init__(self, workers=START_WORKERS):
+        self.workers = max(1, workers)
+        self.queue = asyncio.Queue()
+        self.pending = set()  # navbatdagi yoki bajarilayotgan vazifa kalitlari
+        self.tasks = []
+
+    def start(self):
+        """Worker'larni ishga tushiradi (event loop ichida chaqirilishi kerak)"""
+        for i in range(self.workers):
+            self.tasks.append(asyncio.create_task(self._worker(i)))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def submit(self, key, job, progress=None):
+        """Vazifani navbatga qo'yadi. Shu kalitli vazifa allaqachon bo'lsa False qaytaradi.
+
+        job - `async def job(progress)` ko'rinishidagi funksiya,
+        progress - bosqich matnini qabul qiluvchi async funksiya (ixtiyoriy).
+        """
+        if key in self.pending:
+            return False
+        self.pending.add(key)
+        self.queue.put_nowait((key, job, progress))
+        return True
+
+    def size(self):
+        """Navbatda kutayotgan vazifalar soni"""
+        return self.queue.qsize()
+
+    async def _worker(self, number):
+        while True:
+            key, job, progress = await self.queue.get()
+            try:
+                await job(progress)
+            except Exception as e:
+                logging.error(f"Vazifa {key} bajarilmadi (worker {number}): {e}")
+                if progress:
+                    try:
+                        await progress(f"❌ Xatolik: {e}")
+                    except Exception:
+                        pass
+            finally:
+                self.pending.discard(key)
+                self.queue.task_done()
+
+async def run_bounded(items, worker, limit=START_WORKERS, on_progress=None):
+    """worker(item) ni ko'pi bilan `limit` tadan parallel bajaradi.
+
+    Natijalar items tartibida qaytadi (xatolik bo'lsa - exception obyekti).
+    on_progress(bajarilgan, jami) - har bir element tugaganda chaqiriladigan async funksiya.
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+    total = len(items)
+    done = 0
+
+    async def run(item):
+        nonlocal done
+        async with semaphore:
+            try:
+                result = await worker(item)
+            except Exception as e:
+                logging.error(f"Ommaviy vazifa {item!r} bajarilmadi: {e}")
+                result = e
+        done += 1
+        if on_progress:
+            try:
+                await on_progress(done, total)
+            except Exception as e:
+                logging.debug(f"Progress xabarini yuborib bo'lmadi: {e}")
+        return result
+
+    return await asyncio.gather(*(run(item) for item in items))
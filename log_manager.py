@@ -0,0 +1,448 @@
+import asyncio
+import collections
+import gzip
+import logging
+import os
+import re
+import shutil
+import struct
+import time
+
+# Fayl oxiridan bir martada o'qiladigan blok hajmi
+LOG_BLOCK_SIZE = 8192
+# Log ko'rish uchun standart bayt chegarasi (Telegram xabari baribir 4096 belgidan oshmaydi)
+LOG_TAIL_BYTES = 64 * 1024
+
+def tail_lines(path, lines=20, max_bytes=LOG_TAIL_BYTES):
+    """Faylning oxirgi `lines` ta qatorini qaytaradi.
+
+    Fayl oxiridan orqaga qarab bloklab o'qiladi va `max_bytes` dan ortiq o'qilmaydi,
+    shuning uchun narx fayl hajmiga bog'liq emas.
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        pos = end
+        blocks = []
+        newlines = 0
+        # Oxirgi qator "\n" bilan tugashi mumkin, shuning uchun bitta ortiq qator kerak
+        while pos > 0 and newlines <= lines and end - pos < max_bytes:
+            size = min(LOG_BLOCK_SIZE, pos, max_bytes - (end - pos))
+            pos -= size
+            f.seek(pos)
+            block = f.read(size)
+            blocks.append(block)
+            newlines += block.count(b"\n")
+
+    data = b"".join(reversed(blocks))
+    parts = data.split(b"\n")
+    if pos > 0 and len(parts) > 1:
+        # Birinchi qator chala o'qilgan
+        parts = parts[1:]
+    if parts and parts[-1] == b"":
+        parts = parts[:-1]
+    return b"\n".join(parts[-lines:]).decode("utf-8", errors="ignore")
+
+# Bitta bot logining maksimal hajmi (bayt) va saqlanadigan siqilgan arxivlar soni
+LOG_MAX_BYTES = int(os.getenv("BOT_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv("BOT_LOG_BACKUPS", "3"))
+# Bufer qanchalik tez-tez diskka tushiriladi (soniya) - log ko'ruvchi shu kechikish bilan ko'radi
+LOG_FLUSH_INTERVAL = 1.0
+
+class RotatingLogWriter:
+    """Bot chiqishini buferlab yozadi. Fayl LOG_MAX_BYTES ga yetganda u `bot.log.1.gz`
+    ga siqiladi, eski arxivlar surilib, LOG_BACKUPS tadan ortig'i o'chiriladi.
+    Joriy segment (`bot.log`) doim oddiy matn bo'lib qoladi va LogIndex bilan indekslanadi.
+
+    Konstruktor indeksni log bilan moslaydi, shuning uchun uni thread'da yaratish tavsiya etiladi.
+    """
+
+    def __init__(self, path, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.index = LogIndex(path)
+        self.index.open_for_append()
+        self.file = open(path, "ab", buffering=64 * 1024)
+        self.size = self.file.tell()
+        self.last_flush = time.monotonic()
+        self.dirty = False  # buferda diskka tushmagan ma'lumot bor
+
+    def write(self, data):
+        self.file.write(data)
+        self.index.feed(data, time.time())
+        self.size += len(data)
+        self.dirty = True
+        if time.monotonic() - self.last_flush >= LOG_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        self.index.flush()
+        self.last_flush = time.monotonic()
+        self.dirty = False
+
+    def needs_rotation(self):
+        return self.max_bytes > 0 and self.size >= self.max_bytes
+
+    def archive_path(self, number):
+        return f"{self.path}.{number}.gz"
+
+    def rotate(self):
+        """Joriy segmentni arxivga siqadi va yangisini ochadi (thread'da chaqirish mumkin)"""
+        self.file.close()
+        try:
+            if self.backups > 0:
+                for number in range(self.backups - 1, 0, -1):
+                    if os.path.exists(self.archive_path(number)):
+                        os.replace(self.archive_path(number), self.archive_path(number + 1))
+                rotated = f"{self.path}.1"
+                os.replace(self.path, rotated)
+                with open(rotated, "rb") as src, gzip.open(self.archive_path(1), "wb") as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.remove(rotated)
+            else:
+                os.remove(self.path)
+        finally:
+            self.file = open(self.path, "ab", buffering=64 * 1024)
+            self.size = self.file.tell()
+            self.index.reset()
+
+    def close(self):
+        try:
+            self.file.close()
+        except OSError:
+            pass
+        self.index.close()
+
+# Tayyorlik belgisini qidirishda oldingi bo'lakdan saqlanadigan baytlar (belgi ikki bo'lakka bo'linishi mumkin)
+READY_MARKER_OVERLAP = 256
+
+async def pump_output(stream, writer, chunk_size=64 * 1024, ready=None, markers=None):
+    """Bola jarayon chiqishini pipe'dan o'qib, RotatingLogWriter ga yozadi (EOF gacha).
+
+    ready (asyncio.Event) va markers (bytes regex) berilsa, chiqishda belgi birinchi
+    marta uchraganda ready o'rnatiladi. Shundan keyin qidiruv to'xtaydi.
+    """
+    tail = b""
+    try:
+        while True:
+            # Buferda yozilmagan ma'lumot bo'lmasa, taymersiz kutamiz
+            timeout = LOG_FLUSH_INTERVAL if writer.dirty else None
+            try:
+                chunk = await asyncio.wait_for(stream.read(chunk_size), timeout=timeout)
+            except asyncio.TimeoutError:
+                # Bot jim bo'lsa ham buferdagi qatorlar ko'rinishi kerak
+                writer.flush()
+                continue
+            if not chunk:
+                break
+            if ready is not None and not ready.is_set():
+                window = tail + chunk
+                if markers.search(window):
+                    ready.set()
+                tail = window[-READY_MARKER_OVERLAP:]
+            try:
+                writer.write(chunk)
+                if writer.needs_rotation():
+                    await asyncio.to_thread(writer.rotate)
+            except OSError as e:
+                # Disk to'lgan bo'lsa ham pipe'ni o'qishda davom etamiz, aks holda bot qotib qoladi
+                logging.error(f"Logni yozishda xatolik ({writer.path}): {e}")
+    finally:
+        writer.close()
+
+# Kuzatish rejimi: xabar necha soniyada bir marta tahrirlanadi va necha soniya jimlikdan keyin to'xtaydi
+LOG_FOLLOW_INTERVAL = float(os.getenv("LOG_FOLLOW_INTERVAL", "3"))
+LOG_FOLLOW_IDLE = float(os.getenv("LOG_FOLLOW_IDLE", "120"))
+# Fayl o'sganini tekshirish oralig'i (soniya)
+LOG_POLL_INTERVAL = 1.0
+
+class LogFollower:
+    """Logni offset bo'yicha kuzatadi: faqat yangi qo'shilgan baytlar o'qiladi, qatorlar
+    to'planadi va `on_update` ko'pi bilan har `edit_interval` soniyada bir marta chaqiriladi."""
+
+    def __init__(self, path, on_update, lines=20, edit_interval=LOG_FOLLOW_INTERVAL,
+                 idle_timeout=LOG_FOLLOW_IDLE, max_bytes=LOG_TAIL_BYTES):
+        self.path = path
+        self.on_update = on_update
+        self.lines = collections.deque(maxlen=lines)
+        self.edit_interval = edit_interval
+        self.idle_timeout = idle_timeout
+        self.max_bytes = max_bytes
+        self.offset = 0
+        self.carry = b""  # oxirgi chala qator
+
+    def text(self):
+        return "\n".join(self.lines)
+
+    def _read_new(self):
+        """Offsetdan keyingi yangi qatorlarni o'qiydi. Yangi qator bo'lsa True qaytaradi."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return False
+        if size < self.offset:
+            # Log aylantirilgan (rotation): yangi segment boshidan o'qiymiz
+            self.offset = 0
+            self.carry = b""
+        if size == self.offset:
+            return False
+        # Juda ko'p yozilgan bo'lsa faqat oxirgi qismini o'qiymiz
+        if size - self.offset > self.max_bytes:
+            self.offset = size - self.max_bytes
+            self.carry = b""
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        self.offset += len(data)
+        parts = (self.carry + data).split(b"\n")
+        self.carry = parts.pop()
+        for part in parts:
+            self.lines.append(part.decode("utf-8", errors="ignore"))
+        return bool(parts)
+
+    async def run(self):
+        """Idle timeout tugaguncha (yoki vazifa bekor qilinguncha) kuzatadi"""
+        if os.path.exists(self.path):
+            for line in tail_lines(self.path, self.lines.maxlen, self.max_bytes).split("\n"):
+                self.lines.append(line)
+            self.offset = os.path.getsize(self.path)
+        await self.on_update(self.text())
+
+        loop = asyncio.get_running_loop()
+        last_edit = last_activity = loop.time()
+        pending = False
+        while loop.time() - last_activity < self.idle_timeout:
+            await asyncio.sleep(LOG_POLL_INTERVAL)
+            if self._read_new():
+                pending = True
+                last_activity = loop.time()
+            if pending and loop.time() - last_edit >= self.edit_interval:
+                await self.on_update(self.text())
+                last_edit = loop.time()
+                pending = False
+
+# Log indeksi yozuvlari: qator boshi offseti, vaqt, bayroqlar / faqat xato qatorlari uchun
+INDEX_RECORD = struct.Struct("<QdB")
+ERROR_RECORD = struct.Struct("<Qd")
+FLAG_ERROR = 1
+ERROR_MARKERS = re.compile(rb"Traceback|Error|ERROR|Exception|CRITICAL")
+# Bitta qidiruv so'rovida ko'rib chiqiladigan maksimal log hajmi (bayt)
+LOG_SEARCH_BUDGET = int(os.getenv("LOG_SEARCH_BUDGET", str(4 * 1024 * 1024)))
+# Natijada ko'rsatiladigan bitta qatorning maksimal uzunligi
+LOG_HIT_MAX_CHARS = 300
+
+class LogIndex:
+    """Joriy log segmenti uchun faqat qo'shib boriladigan indeks.
+
+    `bot.log.idx` har bir to'liq qator uchun (offset, vaqt, bayroqlar) saqlaydi,
+    `bot.log.err.idx` esa faqat xato qatorlari uchun (offset, vaqt). Yozuvlar vaqt
+    bo'yicha tartiblangan, shuning uchun so'rovlar ikkilik qidiruv va sahifalash bilan
+    butun faylni o'qimasdan bajariladi. Arxivlangan segmentlar indekslanmaydi.
+    """
+
+    def __init__(self, log_path):
+        self.log_path = log_path
+        self.index_path = log_path + ".idx"
+        self.errors_path = log_path + ".err.idx"
+        self.index_file = None
+        self.errors_file = None
+        self.line_start = 0  # yozilayotgan qatorning boshi
+        self.end = 0  # indekslangan baytlar oxiri
+        self.partial = b""  # tugallanmagan qator (xato belgilarini tekshirish uchun)
+
+    # ---- Yozish tomoni ----
+
+    def _indexed_end(self):
+        """Indeksdagi oxirgi qator tugagan offset (indeks log bilan mos kelmasa None)"""
+        count = self.count()
+        if count == 0:
+            return 0
+        offset = self._record(count - 1)[0]
+        try:
+            with open(self.log_path, "rb") as f:
+                f.seek(offset)
+                line = f.readline()
+        except OSError:
+            return None
+        if not line.endswith(b"\n"):
+            return None
+        return offset + len(line)
+
+    def open_for_append(self):
+        """Indeksni log bilan moslaydi (indekslanmagan oxirini skanerlaydi) va yozishga ochadi"""
+        size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        indexed_end = self._indexed_end()
+        if indexed_end is None or indexed_end > size:
+            indexed_end = 0
+        # Oxirgi to'liq yozuvdan keyingi chala yozuvlarni kesib tashlaymiz
+        self._truncate(self.index_path, self.count() * INDEX_RECORD.size if indexed_end else 0)
+        self._truncate(self.errors_path, self._errors_before(indexed_end) * ERROR_RECORD.size)
+
+        self.index_file = open(self.index_path, "ab", buffering=64 * 1024)
+        self.errors_file = open(self.errors_path, "ab", buffering=16 * 1024)
+        self.line_start = self.end = indexed_end
+        self.partial = b""
+
+        if indexed_end < size:
+            timestamp = os.path.getmtime(self.log_path)
+            with open(self.log_path, "rb") as f:
+                f.seek(indexed_end)
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    self.feed(block, timestamp)
+
+    def _truncate(self, path, size):
+        if not os.path.exists(path):
+            return
+        with open(path, "r+b") as f:
+            f.truncate(size)
+
+    def feed(self, data, timestamp):
+        """Logga qo'shilgan baytlarni indekslaydi"""
+        data_start = self.end
+        pos = 0
+        while True:
+            newline = data.find(b"\n", pos)
+            if newline < 0:
+                if len(self.partial) < LOG_TAIL_BYTES:
+                    self.partial += data[pos:pos + LOG_TAIL_BYTES]
+                break
+            line = self.partial + data[pos:newline]
+            self.partial = b""
+            if ERROR_MARKERS.search(line):
+                self.index_file.write(INDEX_RECORD.pack(self.line_start, timestamp, FLAG_ERROR))
+                self.errors_file.write(ERROR_RECORD.pack(self.line_start, timestamp))
+            else:
+                self.index_file.write(INDEX_RECORD.pack(self.line_start, timestamp, 0))
+            pos = newline + 1
+            self.line_start = data_start + pos
+        self.end = data_start + len(data)
+
+    def flush(self):
+        if self.index_file:
+            self.index_file.flush()
+            self.errors_file.flush()
+
+    def reset(self):
+        """Log aylantirilganda indeks yangi bo'sh segmentdan boshlanadi"""
+        self.close()
+        for path in (self.index_path, self.errors_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.open_for_append()
+
+    def close(self):
+        for f in (self.index_file, self.errors_file):
+            if f:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+        self.index_file = self.errors_file = None
+
+    # ---- O'qish tomoni ----
+
+    def count(self):
+        try:
+            return os.path.getsize(self.index_path) // INDEX_RECORD.size
+        except OSError:
+            return 0
+
+    def _record(self, number, f=None):
+        if f is None:
+            with open(self.index_path, "rb") as f:
+                return self._record(number, f)
+        f.seek(number * INDEX_RECORD.size)
+        return INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))
+
+    def _errors_before(self, offset):
+        """offset dan oldin boshlangan xato qatorlari soni"""
+        try:
+            total = os.path.getsize(self.errors_path) // ERROR_RECORD.size
+        except OSError:
+            return 0
+        with open(self.errors_path, "rb") as f:
+            return self._bisect(f, ERROR_RECORD, total, lambda record: record[0] < offset)
+
+    def _bisect(self, f, record_struct, total, is_before):
+        """is_before(yozuv) rost bo'lgan yozuvlar sonini ikkilik qidiruv bilan topadi"""
+        lo, hi = 0, total
+        while lo < hi:
+            mid = (lo + hi) // 2
+            f.seek(mid * record_struct.size)
+            if is_before(record_struct.unpack(f.read(record_struct.size))):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _read_line(self, log_f, offset):
+        log_f.seek(offset)
+        line = log_f.readline(LOG_HIT_MAX_CHARS * 4)
+        return line.rstrip(b"\r\n").decode("utf-8", errors="ignore")[:LOG_HIT_MAX_CHARS]
+
+    def errors(self, since, cursor=None, limit=10):
+        """`since` vaqtidan keyingi xato qatorlari, eng yangisidan boshlab.
+
+        (natijalar, keyingi_kursor) qaytaradi; natija - (vaqt, qator) juftligi.
+        Keyingi sahifa bo'lmasa kursor None bo'ladi.
+        """
+        try:
+            total = os.path.getsize(self.errors_path) // ERROR_RECORD.size
+        except OSError:
+            return [], None
+        with open(self.errors_path, "rb") as f, open(self.log_path, "rb") as log_f:
+            first = self._bisect(f, ERROR_RECORD, total, lambda record: record[1] < since)
+            end = total if cursor is None else min(cursor, total)
+            start = max(first, end - limit)
+            items = []
+            for number in range(end - 1, start - 1, -1):
+                f.seek(number * ERROR_RECORD.size)
+                offset, timestamp = ERROR_RECORD.unpack(f.read(ERROR_RECORD.size))
+                items.append((timestamp, self._read_line(log_f, offset)))
+        return items, (start if start > first else None)
+
+    def search(self, text, cursor=None, limit=10, budget=LOG_SEARCH_BUDGET):
+        """Matnni o'z ichiga olgan qatorlar (katta-kichik harf farqisiz), eng yangisidan boshlab.
+
+        Bitta chaqiruvda ko'pi bilan `budget` bayt o'qiladi; natijalar yetmasa ham
+        keyingi kursor qaytariladi, qidiruv undan davom ettiriladi.
+        """
+        needle = text.encode("utf-8").lower()
+        total = self.count()
+        if total == 0:
+            return [], None
+        end = total if cursor is None else min(cursor, total)
+        items = []
+        scanned = 0
+        with open(self.index_path, "rb") as f, open(self.log_path, "rb") as log_f:
+            while end > 0 and len(items) < limit and scanned < budget:
+                start = max(0, end - 1024)
+                f.seek(start * INDEX_RECORD.size)
+                raw = f.read((end - start) * INDEX_RECORD.size)
+                records = [INDEX_RECORD.unpack_from(raw, i * INDEX_RECORD.size) for i in range(end - start)]
+                if end < total:
+                    region_end = self._record(end, f)[0]
+                else:
+                    # Oxirgi indekslangan qator tugagan joy: undan keyin yozilgan, hali
+                    # indekslanmagan baytlar oxirgi qatorga qo'shilib ketmasligi kerak
+                    log_f.seek(records[-1][0])
+                    region_end = records[-1][0] + len(log_f.readline())
+                base = records[0][0]
+                log_f.seek(base)
+                region = log_f.read(region_end - base)
+                scanned += len(region)
+
+                line_end = len(region)
+                for number in range(end - 1, start - 1, -1):
+                    offset, timestamp, _ = records[number - start]
+                    line = region[offset - base:line_end]
+                    line_end = offset - base
+                    if needle in line.lower():
+                        text_line = line.rstrip(b"\r\n").decode("utf-8", errors="ignore")
+                        items.append((timestamp, text_line[:LOG_HIT_MAX_CHARS]))
+                        if len(items) >= limit:
+                            return items, (number if number > 0 else None)
+                end = start
+        return items, (end if end > 0 else None)
@@ -1,8 +1,11 @@
 ﻿import asyncio
+import hashlib
+import html
 import logging
 import os
 import shutil
-import json
+import re
+import time
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.filters import Command, StateFilter
 from aiogram.utils.keyboard import InlineKeyboardBuilder
@@ -10,6 +13,10 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from database import Database
 from manager import BotManager
+from job_queue import JobQueue, run_bounded
+from log_manager import LogFollower, LogIndex
+from resource_limits import BotLimits
+from resource_sampler import ResourceSampler
 
 # Logging sozlamalari
 logging.basicConfig(level=logging.INFO)
@@ -20,6 +27,49 @@ bot = Bot(token=API_TOKEN)
 dp = Dispatcher()
 db = Database()
 manager = BotManager()
+job_queue = JobQueue()
+sampler = ResourceSampler(manager)
+
+# Barcha botlarga ta'sir qiluvchi amallarni va cheklovlarni o'zgartirishni bajarishi mumkin bo'lgan Telegram ID lar (vergul bilan).
+# Bo'sh bo'lsa bu amallar hech kimga ruxsat etilmaydi: callback ma'lumotini istalgan foydalanuvchi
+# o'z klientidan yuborishi mumkin, admin paroli esa callback'larda tekshirilmaydi.
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").replace(",", " ").split() if x.isdigit()}
+# Admin panel ro'yxatlarida bir sahifadagi elementlar soni
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "20"))
+# Bitta botga qo'shish mumkin bo'lgan env o'zgaruvchilari soni
+ENV_VARS_MAX = int(os.getenv("BOT_ENV_MAX", "30"))
+# env_del_<id>_<KEY> callback'i Telegram'ning 64 baytlik chegarasiga sig'ishi uchun
+ENV_KEY_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]{0,31}")
+# Ro'yxatda kalit va qiymatning ko'rsatiladigan qismi (xabar 4096 belgidan oshmasligi uchun)
+ENV_KEY_PREVIEW = 32
+ENV_VALUE_PREVIEW = 48
+
+# Bot holatlari: (belgi, matn)
+BOT_STATUSES = {
+    "running": ("🟢", "Ishlamoqda"),
+    "restarting": ("🟡", "Qayta ishga tushirilmoqda"),
+    "crashloop": ("🔁", "Doimiy qulamoqda (crash-loop)"),
+    "stopped": ("🔴", "To'xtatilgan"),
+}
+# Bu holatlarda botni to'xtatish mumkin
+ACTIVE_STATUSES = ("running", "restarting")
+
+# Xizmat to'xtaganda botlar ham to'xtatilsinmi. Bazadagi holati o'zgarmaydi, shuning uchun
+# xizmat qayta ishga tushganda ular tiklanadi. 0 bo'lsa botlar ishlashda davom etadi.
+STOP_BOTS_ON_EXIT = os.getenv("STOP_BOTS_ON_EXIT", "1") == "1"
+
+# Ommaviy amallarda qayta ishga tushiriladigan holatlar
+RESTARTABLE_STATUSES = ACTIVE_STATUSES + ("crashloop",)
+# Ommaviy qayta ishga tushirishda bir vaqtda ishlanadigan botlar soni
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", "4"))
+# Ommaviy amal progress xabari ko'pi bilan shuncha soniyada bir marta tahrirlanadi
+BULK_PROGRESS_INTERVAL = 3.0
+
+# Hozir bajarilayotgan ommaviy amal (bir vaqtda bittadan ortiq bo'lmaydi)
+bulk_task = None
+
+# Jonli kuzatilayotgan log xabarlari: (chat_id, message_id): asyncio.Task
+follow_tasks = {}
 
 class AddBot(StatesGroup):
     waiting_for_name = State()
@@ -38,12 +88,17 @@ class EditBot(StatesGroup):
     waiting_for_requirements = State()
     waiting_for_file_edit = State() # Fayl menejeri uchun yangi state
 
+class LogSearch(StatesGroup):
+    waiting_for_query = State()
+
 class AdminPanel(StatesGroup):
     waiting_for_password = State()
+    waiting_for_limit = State()
+    waiting_for_owner_id = State()
 
 @dp.message(Command("start"))
 async def cmd_start(message: types.Message):
-    db.add_user(message.from_user.id, message.from_user.username)
+    await db.add_user(message.from_user.id, message.from_user.username, wait=False)
     await show_main_menu(message)
 
 @dp.message(F.text == "enteradmin.panel")
@@ -65,6 +120,8 @@ async def show_admin_menu(message_or_callback):
     kb = InlineKeyboardBuilder()
     kb.button(text="👥 Foydalanuvchilar", callback_data="admin_users")
     kb.button(text="🤖 Barcha Botlar", callback_data="admin_all_bots")
+    kb.button(text="📈 Resurslar", callback_data="admin_resources")
+    kb.button(text="🛠 Ommaviy amallar", callback_data="admin_bulk")
     kb.button(text="⬅️ Chiqish", callback_data="start_menu")
     kb.adjust(1)
     
@@ -75,11 +132,47 @@ async def show_admin_menu(message_or_callback):
     else:
         await message_or_callback.message.edit_text(text, reply_markup=kb.as_markup())
 
-@dp.callback_query(F.data == "admin_users")
+async def deny_non_admin(event):
+    """Foydalanuvchi ADMIN_IDS da bo'lmasa rad javobini beradi va True qaytaradi"""
+    if event.from_user and event.from_user.id in ADMIN_IDS:
+        return False
+    text = "⛔ Bu amal faqat administratorlar uchun"
+    if isinstance(event, types.CallbackQuery):
+        await event.answer(text, show_alert=True)
+    else:
+        await event.answer(text)
+    return True
+
+def parse_page_cursor(data, prefix):
+    """'<prefix>n_<id>' -> (id, None), '<prefix>p_<id>' -> (None, id), boshqasi -> (None, None)"""
+    if not data.startswith(prefix):
+        return None, None
+    direction, cursor = data[len(prefix):].split("_")
+    return (int(cursor), None) if direction == "n" else (None, int(cursor))
+
+async def load_page(fetch, after_id, before_id):
+    """Sahifani yuklaydi: (qatorlar, oldingi sahifa bormi, keyingi sahifa bormi)"""
+    rows, more = await fetch(after_id=after_id, before_id=before_id, limit=ADMIN_PAGE_SIZE)
+    if before_id is not None:
+        return rows, more, True
+    return rows, after_id is not None, more
+
+def add_page_buttons(kb, prefix, first_id, last_id, has_prev, has_next):
+    """Sahifalash tugmalarini qo'shadi, qo'shilgan tugmalar sonini qaytaradi"""
+    count = 0
+    if has_prev:
+        kb.button(text="⬅️ Oldingi", callback_data=f"{prefix}p_{first_id}")
+        count += 1
+    if has_next:
+        kb.button(text="Keyingi ➡️", callback_data=f"{prefix}n_{last_id}")
+        count += 1
+    return count
+
+@dp.callback_query((F.data == "admin_users") | F.data.startswith("admin_users_pg_"))
 async def cb_admin_users(callback: types.CallbackQuery):
-    # Database'dan barcha foydalanuvchilarni olish (Database klassiga yangi metod kerak)
-    users = db.get_all_users()
-    if not users:
+    after_id, before_id = parse_page_cursor(callback.data, "admin_users_pg_")
+    users, has_prev, has_next = await load_page(db.get_users_page, after_id, before_id)
+    if not users and after_id is None and before_id is None:
         await callback.answer("Foydalanuvchilar yo'q.")
         return
     
@@ -87,44 +180,275 @@ async def cb_admin_users(callback: types.CallbackQuery):
     for u in users:
         username = u[2] if u[2] else "Noma'lum"
         text += f"ID: {u[1]} | User: @{username}\n"
+    if not users:
+        text += "📭 Bu sahifa bo'sh.\n"
     
     kb = InlineKeyboardBuilder()
+    nav = 0
+    if users:
+        nav = add_page_buttons(kb, "admin_users_pg_", users[0][0], users[-1][0], has_prev, has_next)
     kb.button(text="⬅️ Orqaga", callback_data="admin_menu")
+    kb.adjust(*([nav] if nav else []), 1)
     
     await callback.message.edit_text(text, reply_markup=kb.as_markup())
 
+@dp.callback_query(F.data == "admin_resources")
+async def cb_admin_resources(callback: types.CallbackQuery):
+    top = sampler.top(10)
+    lines = []
+    for bot_id, avg_cpu, peak_rss in top:
+        bot_data = await db.get_bot(bot_id)
+        name = bot_data.name if bot_data else bot_id
+        lines.append(f"🤖 {name} (User: {bot_data.owner_id if bot_data else '?'})\n"
+                     f"   CPU o'rtacha: {avg_cpu:.1f}% | RSS eng yuqori: {peak_rss:.0f} MB")
+    text = "📈 Eng ko'p resurs ishlatayotgan botlar:\n\n" + ("\n".join(lines) or "Hali ma'lumot yo'q.")
+    
+    kb = InlineKeyboardBuilder()
+    kb.button(text="🔄 Yangilash", callback_data="admin_resources")
+    kb.button(text="⬅️ Orqaga", callback_data="admin_menu")
+    kb.adjust(2)
+    try:
+        await callback.message.edit_text(text, reply_markup=kb.as_markup())
+    except Exception as e:
+        # Ma'lumot o'zgarmagan bo'lsa Telegram xato qaytaradi
+        logging.debug(f"Resurslar xabarini tahrirlab bo'lmadi: {e}")
+        await callback.answer()
+
+BULK_ACTIONS = {
+    "restart": "🔁 Barcha ishlayotgan botlarni qayta ishga tushirish",
+    "stop": "⏹ Barcha ishlayotgan botlarni to'xtatish",
+}
+
+@dp.callback_query(F.data == "admin_bulk")
+async def cb_admin_bulk(callback: types.CallbackQuery):
+    kb = InlineKeyboardBuilder()
+    kb.button(text="🔁 Hammasini qayta ishga tushirish", callback_data="admin_bulk_restart")
+    kb.button(text="⏹ Hammasini to'xtatish", callback_data="admin_bulk_stop")
+    kb.button(text="👤 Foydalanuvchi botlarini qayta ishga tushirish", callback_data="admin_bulk_owner")
+    kb.button(text="⬅️ Orqaga", callback_data="admin_menu")
+    kb.adjust(1)
+    
+    status = "\n\n⏳ Hozir ommaviy amal bajarilmoqda." if bulk_task and not bulk_task.done() else ""
+    await callback.message.edit_text(f"🛠 Ommaviy amallar{status}", reply_markup=kb.as_markup())
+
+@dp.callback_query(F.data.in_({"admin_bulk_restart", "admin_bulk_stop"}))
+async def cb_admin_bulk_confirm(callback: types.CallbackQuery):
+    action = callback.data.split("_")[2]
+    kb = InlineKeyboardBuilder()
+    kb.button(text="✅ Ha", callback_data=f"admin_bulkgo_{action}")
+    kb.button(text="❌ Yo'q", callback_data="admin_bulk")
+    kb.adjust(2)
+    await callback.message.edit_text(f"{BULK_ACTIONS[action]}?\n\nTasdiqlaysizmi?", reply_markup=kb.as_markup())
+
+@dp.callback_query(F.data.startswith("admin_bulkgo_"))
+async def cb_admin_bulk_run(callback: types.CallbackQuery):
+    if await deny_non_admin(callback):
+        return
+    action = callback.data.split("_")[2]
+    if action == "restart":
+        bots = await db.get_bots_by_status(RESTARTABLE_STATUSES)
+        await start_bulk(callback, BULK_ACTIONS[action], bots, restart_bot, BULK_WORKERS)
+    else:
+        bots = await db.get_bots_by_status(ACTIVE_STATUSES)
+        # To'xtatish arzon, hammasi birdaniga
+        await start_bulk(callback, BULK_ACTIONS[action], bots, stop_bot_record, len(bots))
+
+@dp.callback_query(F.data == "admin_bulk_owner")
+async def cb_admin_bulk_owner(callback: types.CallbackQuery, state: FSMContext):
+    await state.set_state(AdminPanel.waiting_for_owner_id)
+    await callback.message.edit_text("Botlari qayta ishga tushiriladigan foydalanuvchining Telegram ID sini kiriting:")
+
+@dp.message(AdminPanel.waiting_for_owner_id)
+async def process_bulk_owner(message: types.Message, state: FSMContext):
+    if await deny_non_admin(message):
+        await state.clear()
+        return
+    text = (message.text or "").strip()
+    if not text.isdigit():
+        await message.answer("❌ ID faqat raqamlardan iborat bo'lishi kerak. Qayta kiriting:")
+        return
+    await state.clear()
+    owner_id = int(text)
+    bots = [b for b in await db.get_user_bots(owner_id) if b.status in RESTARTABLE_STATUSES]
+    progress_message = await message.answer("⏳ Tayyorlanmoqda...")
+    await start_bulk(progress_message, f"🔁 {owner_id} foydalanuvchi botlarini qayta ishga tushirish",
+                     bots, restart_bot, BULK_WORKERS)
+
+async def restart_bot(bot_data):
+    """Botni to'xtatib, qaytadan (to'liq tayyorlash bilan) ishga tushiradi"""
+    stopped, msg = await manager.stop_bot(bot_data.id)
+    if not stopped and bot_data.id in manager.processes:
+        # To'xtatib bo'lmadi - bot hali ishlayapti, bazadagi holati o'zgartirilmaydi
+        return False, msg
+    env_vars = await db.get_env_vars(bot_data.id)
+    success, msg = await manager.start_bot(bot_data.id, bot_data.path, bot_data.token, env_vars,
+                                           limits=BotLimits.from_record(bot_data))
+    if success:
+        await db.update_bot_status(bot_data.id, "running", *manager.process_identity(bot_data.id), wait=False)
+    else:
+        await db.update_bot_status(bot_data.id, "stopped", wait=False)
+    return success, msg
+
+async def stop_bot_record(bot_data):
+    stopped, msg = await manager.stop_bot(bot_data.id)
+    if not stopped and bot_data.id in manager.processes:
+        return False, msg
+    # Bot ishlamayotgan bo'lsa ham (masalan, bazada eski holat qolgan) "stopped" yoziladi
+    await db.update_bot_status(bot_data.id, "stopped", wait=False)
+    return True, "✅ Bot to'xtatildi"
+
+async def start_bulk(target, title, bots, action, limit):
+    """Ommaviy amalni fonda boshlaydi. target - callback (xabari tahrirlanadi) yoki xabar."""
+    global bulk_task
+    message = target.message if isinstance(target, types.CallbackQuery) else target
+    if bulk_task and not bulk_task.done():
+        if isinstance(target, types.CallbackQuery):
+            await target.answer("⏳ Boshqa ommaviy amal hali tugamagan", show_alert=True)
+        else:
+            await message.edit_text("⏳ Boshqa ommaviy amal hali tugamagan")
+        return
+    if not bots:
+        await message.edit_text(f"{title}\n\nMos botlar yo'q.", reply_markup=bulk_done_keyboard())
+        return
+    bulk_task = asyncio.create_task(run_bulk(message, title, bots, action, limit))
+
+def bulk_done_keyboard():
+    kb = InlineKeyboardBuilder()
+    kb.button(text="⬅️ Ommaviy amallar", callback_data="admin_bulk")
+    return kb.as_markup()
+
+async def run_bulk(message: types.Message, title, bots, action, limit):
+    """Amalni botlar ustida cheklangan parallellikda bajaradi va bitta xabarda natijani ko'rsatadi"""
+    failures = []
+    last_edit = 0.0
+    
+    async def worker(bot_data):
+        try:
+            success, msg = await action(bot_data)
+        except Exception as e:
+            success, msg = False, str(e)
+        if not success:
+            failures.append(f"{bot_data.name} (ID {bot_data.id}): {msg}")
+    
+    async def on_progress(done, total):
+        nonlocal last_edit
+        # Oxirgi holat yakuniy xabarda ko'rsatiladi
+        if done == total or time.monotonic() - last_edit < BULK_PROGRESS_INTERVAL:
+            return
+        last_edit = time.monotonic()
+        await message.edit_text(f"{title}\n\n⏳ {done}/{total} bajarildi, ❌ {len(failures)} ta xato")
+    
+    try:
+        await message.edit_text(f"{title}\n\n⏳ 0/{len(bots)} bajarildi")
+    except Exception as e:
+        logging.debug(f"Progress xabarini tahrirlab bo'lmadi: {e}")
+    await run_bounded(bots, worker, limit, on_progress)
+    await db.flush()
+    
+    text = f"{title}\n\n✅ Tugadi: {len(bots) - len(failures)}/{len(bots)} muvaffaqiyatli"
+    if failures:
+        shown = "\n".join(f"• {f}" for f in failures[:10])
+        more = f"\n... va yana {len(failures) - 10} ta" if len(failures) > 10 else ""
+        text += f"\n\n❌ Xatolar:\n{shown}{more}"
+    try:
+        await message.edit_text(text[:4000], reply_markup=bulk_done_keyboard())
+    except Exception as e:
+        logging.error(f"Ommaviy amal natijasini yuborib bo'lmadi: {e}")
+
 @dp.callback_query(F.data == "admin_menu")
 async def cb_admin_menu(callback: types.CallbackQuery):
     await show_admin_menu(callback)
 
-@dp.callback_query(F.data == "admin_all_bots")
+@dp.callback_query((F.data == "admin_all_bots") | F.data.startswith("admin_bots_pg_"))
 async def cb_admin_all_bots(callback: types.CallbackQuery):
-    # Barcha botlarni olish (Database klassiga yangi metod kerak)
-    bots = db.get_all_bots()
-    if not bots:
+    after_id, before_id = parse_page_cursor(callback.data, "admin_bots_pg_")
+    bots, has_prev, has_next = await load_page(db.get_bots_page, after_id, before_id)
+    if not bots and after_id is None and before_id is None:
         await callback.answer("Botlar yo'q.")
         return
     
     kb = InlineKeyboardBuilder()
     for b in bots:
-        kb.button(text=f"🤖 {b[2]} (User: {b[1]})", callback_data=f"admin_manage_{b[0]}")
+        kb.button(text=f"🤖 {b.name} (User: {b.owner_id})", callback_data=f"admin_manage_{b.id}")
+    nav = 0
+    if bots:
+        nav = add_page_buttons(kb, "admin_bots_pg_", bots[0].id, bots[-1].id, has_prev, has_next)
     kb.button(text="⬅️ Orqaga", callback_data="admin_menu")
-    kb.adjust(1)
+    kb.adjust(*([1] * len(bots)), *([nav] if nav else []), 1)
     
-    await callback.message.edit_text("Barcha botlar:", reply_markup=kb.as_markup())
+    text = "Barcha botlar:" if bots else "Barcha botlar:\n\n📭 Bu sahifa bo'sh."
+    await callback.message.edit_text(text, reply_markup=kb.as_markup())
 
 @dp.callback_query(F.data.startswith("admin_manage_"))
 async def cb_admin_manage_bot(callback: types.CallbackQuery):
     bot_id = int(callback.data.split("_")[2])
-    bot_data = db.get_bot(bot_id)
+    bot_data = await db.get_bot(bot_id)
     
     kb = InlineKeyboardBuilder()
     kb.button(text="📂 Fayllarni ko'rish", callback_data=f"files_{bot_id}") # Mavjud fayl menejerini ishlatamiz
+    kb.button(text="📏 Cheklovlar", callback_data=f"admin_limits_{bot_id}")
     kb.button(text="⬅️ Orqaga", callback_data="admin_all_bots")
     kb.adjust(1)
     
     await callback.message.edit_text(
-        f"🤖 Bot: {bot_data[2]}\n👤 Egasi ID: {bot_data[1]}\n📊 Status: {bot_data[4]}",
+        f"🤖 Bot: {bot_data.name}\n👤 Egasi ID: {bot_data.owner_id}\n📊 Status: {bot_data.status}\n\n"
+        f"{BotLimits.from_record(bot_data).describe(manager.cgroups.available)}",
+        reply_markup=kb.as_markup()
+    )
+
+@dp.callback_query(F.data.startswith("admin_limits_"))
+async def cb_admin_limits(callback: types.CallbackQuery):
+    bot_id = int(callback.data.split("_")[2])
+    bot_data = await db.get_bot(bot_id)
+    
+    kb = InlineKeyboardBuilder()
+    for field, label in BotLimits.FIELDS.items():
+        kb.button(text=label, callback_data=f"admin_limit_{bot_id}_{field}")
+    kb.button(text="⬅️ Orqaga", callback_data=f"admin_manage_{bot_id}")
+    kb.adjust(2)
+    
+    await callback.message.edit_text(
+        f"📏 Bot: {bot_data.name} cheklovlari\n\n{BotLimits.from_record(bot_data).describe(manager.cgroups.available)}\n\n"
+        "O'zgartirish uchun cheklovni tanlang. Yangi qiymatlar bot keyingi marta ishga tushganda qo'llanadi.",
+        reply_markup=kb.as_markup()
+    )
+
+@dp.callback_query(F.data.startswith("admin_limit_"))
+async def cb_admin_limit_edit(callback: types.CallbackQuery, state: FSMContext):
+    if await deny_non_admin(callback):
+        return
+    # Maydon nomida ham "_" bor (masalan, memory_mb)
+    _, _, bot_id, field = callback.data.split("_", 3)
+    await state.update_data(bot_id=int(bot_id), limit_field=field)
+    await state.set_state(AdminPanel.waiting_for_limit)
+    await callback.message.edit_text(
+        f"{BotLimits.FIELDS[field]} uchun yangi qiymatni kiriting:\n"
+        "0 - cheklanmagan, \"-\" - standart qiymat."
+    )
+
+@dp.message(AdminPanel.waiting_for_limit)
+async def process_admin_limit(message: types.Message, state: FSMContext):
+    if await deny_non_admin(message):
+        await state.clear()
+        return
+    text = (message.text or "").strip()
+    if text == "-":
+        value = None
+    elif text.isdigit():
+        value = int(text)
+    else:
+        await message.answer("❌ Butun son, 0 yoki \"-\" kiriting:")
+        return
+    
+    data = await state.get_data()
+    await state.clear()
+    await db.set_bot_limit(data['bot_id'], data['limit_field'], value)
+    bot_data = await db.get_bot(data['bot_id'])
+    
+    kb = InlineKeyboardBuilder()
+    kb.button(text="📏 Cheklovlar", callback_data=f"admin_limits_{data['bot_id']}")
+    await message.answer(
+        f"✅ Saqlandi.\n\n{BotLimits.from_record(bot_data).describe(manager.cgroups.available)}",
         reply_markup=kb.as_markup()
     )
 
@@ -152,6 +476,12 @@ async def cb_add_bot(callback: types.CallbackQuery, state: FSMContext):
 
 @dp.message(AddBot.waiting_for_name)
 async def process_name(message: types.Message, state: FSMContext):
+    if not message.text:
+        await message.answer("Iltimos, bot nomini matn ko'rinishida yuboring:")
+        return
+    if await db.get_user_bot_by_name(message.from_user.id, message.text):
+        await message.answer("❌ Sizda bu nomdagi bot allaqachon bor. Boshqa nom kiriting:")
+        return
     await state.update_data(name=message.text)
     await state.set_state(AddBot.waiting_for_token)
     await message.answer("Bot API tokenini kiriting:")
@@ -178,7 +508,10 @@ async def process_python_file(message: types.Message, state: FSMContext):
     file = await bot.get_file(file_id)
     await bot.download_file(file.file_path, os.path.join(full_path, "main.py"))
     
-    db.add_bot(message.from_user.id, data['name'], data['token'], bot_dir)
+    if await db.add_bot(message.from_user.id, data['name'], data['token'], bot_dir) is None:
+        await state.clear()
+        await message.answer("❌ Botni saqlab bo'lmadi. Boshqa nom bilan qaytadan urinib ko'ring.")
+        return
     
     kb = InlineKeyboardBuilder()
     kb.button(text="✅ Ha", callback_data="extra_files_yes")
@@ -249,15 +582,15 @@ async def process_requirements_file(message: types.Message, state: FSMContext):
 
 @dp.callback_query(F.data == "my_bots")
 async def cb_my_bots(callback: types.CallbackQuery):
-    bots = db.get_user_bots(callback.from_user.id)
+    bots = await db.get_user_bots(callback.from_user.id)
     if not bots:
         await callback.answer("Sizda hali botlar yo'q.", show_alert=True)
         return
 
     kb = InlineKeyboardBuilder()
     for b in bots:
-        status_emoji = "🟢" if b[4] == "running" else "🔴"
-        kb.button(text=f"{status_emoji} {b[2]}", callback_data=f"manage_{b[0]}")
+        status_emoji = BOT_STATUSES.get(b.status, BOT_STATUSES["stopped"])[0]
+        kb.button(text=f"{status_emoji} {b.name}", callback_data=f"manage_{b.id}")
     kb.button(text="⬅️ Orqaga", callback_data="start_menu")
     kb.adjust(1)
     
@@ -266,14 +599,15 @@ async def cb_my_bots(callback: types.CallbackQuery):
 @dp.callback_query(F.data.startswith("manage_"))
 async def cb_manage_bot(callback: types.CallbackQuery):
     bot_id = int(callback.data.split("_")[1])
-    bot_data = db.get_bot(bot_id)
+    bot_data = await db.get_bot(bot_id)
+    stop_log_follow(callback.message)
     
     if not bot_data:
         await callback.answer("Bot topilmadi")
         return
 
     kb = InlineKeyboardBuilder()
-    if bot_data[4] == "running":
+    if bot_data.status in ACTIVE_STATUSES:
         kb.button(text="🛑 To'xtatish", callback_data=f"stop_{bot_id}")
     else:
         kb.button(text="▶️ Ishga tushirish", callback_data=f"start_{bot_id}")
@@ -286,53 +620,100 @@ async def cb_manage_bot(callback: types.CallbackQuery):
     kb.button(text="⬅️ Orqaga", callback_data="my_bots")
     kb.adjust(2)
     
-    status_text = "🟢 Ishlamoqda" if bot_data[4] == "running" else "🔴 To'xtatilgan"
+    status_text = " ".join(BOT_STATUSES.get(bot_data.status, BOT_STATUSES["stopped"]))
+    stats = sampler.stats(bot_id)
+    usage_text = ""
+    if stats:
+        usage_text = (
+            f"🖥 CPU: {stats['cpu']:.1f}% (eng yuqori {stats['peak_cpu']:.1f}%)\n"
+            f"💾 RAM: {stats['rss_mb']:.0f} MB (eng yuqori {stats['peak_rss_mb']:.0f} MB)\n"
+        )
     
     await callback.message.edit_text(
-        f"🤖 Bot: {bot_data[2]}\n"
+        f"🤖 Bot: {bot_data.name}\n"
         f"📊 Status: {status_text}\n"
-        f"🔑 Token: {bot_data[3][:10]}...\n"
-        f"📁 Path: {bot_data[5]}",
+        f"{usage_text}"
+        f"🔑 Token: {bot_data.token[:10]}...\n"
+        f"📁 Path: {bot_data.path}",
         reply_markup=kb.as_markup()
     )
 
 @dp.callback_query(F.data.startswith("start_"))
 async def cb_start_bot(callback: types.CallbackQuery):
     bot_id = int(callback.data.split("_")[1])
-    bot_data = db.get_bot(bot_id)
+    bot_data = await db.get_bot(bot_id)
+    
+    env_vars = await db.get_env_vars(bot_id)
+    progress = make_progress_reporter(callback.message, bot_data.name)
     
-    env_vars = json.loads(bot_data[6]) if bot_data[6] else {}
-    success, msg = manager.start_bot(bot_id, bot_data[5], bot_data[3], env_vars)
+    queued = asyncio.Event()
+    
+    async def job(progress):
+        # Bo'sh worker vazifani darhol olishi mumkin: "Navbatda" xabari bosqichlar ustiga yozilmasin
+        await queued.wait()
+        await run_start_bot(callback, bot_id, bot_data, env_vars, progress)
+    
+    # Ishga tushirish navbatga qo'yiladi, handler darhol qaytadi
+    ahead = job_queue.size()
+    if bot_id in manager.processes or not job_queue.submit(("start", bot_id), job, progress):
+        await callback.answer("ℹ️ Bot allaqachon ishlayapti yoki ishga tushirilmoqda", show_alert=True)
+        return
+    
+    try:
+        await callback.answer("⏳ Navbatga qo'shildi")
+        await progress(f"⏳ Navbatda kutilmoqda (oldinda: {ahead})...")
+    finally:
+        queued.set()
+
+def make_progress_reporter(message: types.Message, bot_name):
+    """Bosqichlar haqida foydalanuvchi xabarini tahrirlab boruvchi funksiya yaratadi"""
+    async def progress(stage):
+        try:
+            await message.edit_text(f"🤖 Bot: {bot_name}\n\n{stage}")
+        except Exception as e:
+            # "message is not modified" va shunga o'xshash xatolar muhim emas
+            logging.debug(f"Progress xabarini tahrirlab bo'lmadi: {e}")
+    return progress
+
+async def run_start_bot(callback: types.CallbackQuery, bot_id, bot_data, env_vars, progress):
+    success, msg = await manager.start_bot(bot_id, bot_data.path, bot_data.token, env_vars, progress,
+                                           limits=BotLimits.from_record(bot_data))
     
     if success:
-        db.update_bot_status(bot_id, "running")
-        await callback.answer(msg, show_alert=False)
+        await db.update_bot_status(bot_id, "running", *manager.process_identity(bot_id))
         await cb_manage_bot(callback)
     else:
-        await callback.answer(f"❌ {msg}", show_alert=True)
+        kb = InlineKeyboardBuilder()
+        kb.button(text="📜 Loglar", callback_data=f"logs_{bot_id}")
+        kb.button(text="⬅️ Orqaga", callback_data=f"manage_{bot_id}")
+        kb.adjust(2)
+        await callback.message.edit_text(
+            f"🤖 Bot: {bot_data.name}\n\n❌ {msg}",
+            reply_markup=kb.as_markup()
+        )
 
 @dp.callback_query(F.data.startswith("stop_"))
 async def cb_stop_bot(callback: types.CallbackQuery):
     bot_id = int(callback.data.split("_")[1])
-    success, msg = manager.stop_bot(bot_id)
+    success, msg = await manager.stop_bot(bot_id)
     if success:
-        db.update_bot_status(bot_id, "stopped")
+        await db.update_bot_status(bot_id, "stopped")
         await callback.answer(msg, show_alert=False)
         await cb_manage_bot(callback)
     else:
         await callback.answer(f"❌ {msg}", show_alert=True)
 
-@dp.callback_query(F.data.startswith("logs_"))
-async def cb_view_logs(callback: types.CallbackQuery):
-    bot_id = int(callback.data.split("_")[1])
-    bot_data = db.get_bot(bot_id)
-    logs = manager.get_logs(bot_data[5])
-    
+def logs_keyboard(bot_id):
     kb = InlineKeyboardBuilder()
     kb.button(text="🔄 Yangilash", callback_data=f"logs_{bot_id}")
+    kb.button(text="📡 Kuzatish", callback_data=f"logfollow_{bot_id}")
+    kb.button(text="❗ Xatolar (1 soat)", callback_data=f"logerr_{bot_id}")
+    kb.button(text="🔎 Qidirish", callback_data=f"logsearch_{bot_id}")
     kb.button(text="⬅️ Orqaga", callback_data=f"manage_{bot_id}")
     kb.adjust(2)
-    
+    return kb.as_markup()
+
+def format_logs(bot_name, logs, title="Loglar"):
     # Loglarni formatlash
     if len(logs) > 4000:
         logs = logs[-4000:]
@@ -340,34 +721,181 @@ async def cb_view_logs(callback: types.CallbackQuery):
     # Backticks larni almashtirish
     logs = logs.replace('`', "'")
     
+    return f"📜 Bot: {bot_name}\n\n{title}:\n{logs}"
+
+def stop_log_follow(message: types.Message):
+    """Shu xabardagi jonli log kuzatishni to'xtatadi"""
+    task = follow_tasks.pop((message.chat.id, message.message_id), None)
+    if task:
+        task.cancel()
+
+@dp.callback_query(F.data.startswith("logs_"))
+async def cb_view_logs(callback: types.CallbackQuery):
+    bot_id = int(callback.data.split("_")[1])
+    bot_data = await db.get_bot(bot_id)
+    stop_log_follow(callback.message)
+    logs = manager.get_logs(bot_data.path)
+    
+    await callback.message.edit_text(format_logs(bot_data.name, logs), reply_markup=logs_keyboard(bot_id))
+
+@dp.callback_query(F.data.startswith("logfollow_"))
+async def cb_follow_logs(callback: types.CallbackQuery):
+    bot_id = int(callback.data.split("_")[1])
+    bot_data = await db.get_bot(bot_id)
+    message = callback.message
+    key = (message.chat.id, message.message_id)
+    stop_log_follow(message)
+    
+    kb = InlineKeyboardBuilder()
+    kb.button(text="⏹ To'xtatish", callback_data=f"logs_{bot_id}")
+    kb.button(text="⬅️ Orqaga", callback_data=f"manage_{bot_id}")
+    kb.adjust(2)
+    
+    async def on_update(logs):
+        try:
+            await message.edit_text(
+                format_logs(bot_data.name, logs or "📭 Loglar bo'sh", "📡 Loglar (jonli)"),
+                reply_markup=kb.as_markup()
+            )
+        except Exception as e:
+            logging.debug(f"Log xabarini tahrirlab bo'lmadi: {e}")
+    
+    async def follow():
+        try:
+            follower = LogFollower(manager.log_path(bot_data.path), on_update)
+            await follower.run()
+            # Uzoq vaqt yangi qator bo'lmadi - oddiy ko'rinishga qaytamiz
+            await message.edit_text(
+                format_logs(bot_data.name, follower.text() or "📭 Loglar bo'sh", "⏸ Loglar (kuzatish to'xtadi)"),
+                reply_markup=logs_keyboard(bot_id)
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.debug(f"Log kuzatish tugadi: {e}")
+        finally:
+            if follow_tasks.get(key) is task:
+                del follow_tasks[key]
+    
+    task = asyncio.create_task(follow())
+    follow_tasks[key] = task
+    await callback.answer("📡 Kuzatish boshlandi")
+
+def format_log_hits(bot_name, title, items):
+    """Indeks bo'yicha topilgan qatorlarni xabar matniga aylantiradi"""
+    text = f"📜 Bot: {bot_name}\n\n{title}:\n"
+    if not items:
+        return text + "Hech narsa topilmadi."
+    for timestamp, line in items:
+        entry = f"[{time.strftime('%d.%m %H:%M:%S', time.localtime(timestamp))}] {line}\n"
+        if len(text) + len(entry) > 4000:
+            break
+        text += entry
+    return text.replace('`', "'")
+
+def log_page_keyboard(bot_id, next_callback):
+    kb = InlineKeyboardBuilder()
+    if next_callback:
+        kb.button(text="⏪ Eskiroq", callback_data=next_callback)
+    kb.button(text="⬅️ Orqaga", callback_data=f"logs_{bot_id}")
+    kb.adjust(2)
+    return kb.as_markup()
+
+@dp.callback_query(F.data.startswith("logerr_"))
+async def cb_log_errors(callback: types.CallbackQuery):
+    parts = callback.data.split("_")
+    bot_id = int(parts[1])
+    cursor = int(parts[2]) if len(parts) > 2 else None
+    bot_data = await db.get_bot(bot_id)
+    
+    index = LogIndex(manager.log_path(bot_data.path))
+    items, next_cursor = await asyncio.to_thread(index.errors, time.time() - 3600, cursor)
+    
+    next_callback = f"logerr_{bot_id}_{next_cursor}" if next_cursor is not None else None
     await callback.message.edit_text(
-        f"📜 Bot: {bot_data[2]}\n\n"
-        f"Loglar:\n"
-        f"{logs}",
-        reply_markup=kb.as_markup()
+        format_log_hits(bot_data.name, "❗ Oxirgi 1 soatdagi xatolar", items),
+        reply_markup=log_page_keyboard(bot_id, next_callback)
     )
 
+@dp.callback_query(F.data.startswith("logsearch_"))
+async def cb_log_search(callback: types.CallbackQuery, state: FSMContext):
+    bot_id = int(callback.data.split("_")[1])
+    stop_log_follow(callback.message)
+    await state.update_data(bot_id=bot_id)
+    await state.set_state(LogSearch.waiting_for_query)
+    await callback.message.edit_text("🔎 Loglardan qidiriladigan matnni yuboring:")
+
+async def build_log_search_page(bot_id, query, cursor):
+    bot_data = await db.get_bot(bot_id)
+    index = LogIndex(manager.log_path(bot_data.path))
+    items, next_cursor = await asyncio.to_thread(index.search, query, cursor)
+    next_callback = f"logfind_{bot_id}_{next_cursor}" if next_cursor is not None else None
+    text = format_log_hits(bot_data.name, f"🔎 \"{query}\" bo'yicha natijalar", items)
+    return text, log_page_keyboard(bot_id, next_callback)
+
+@dp.message(LogSearch.waiting_for_query)
+async def process_log_query(message: types.Message, state: FSMContext):
+    if not message.text:
+        await message.answer("Iltimos, matn yuboring.")
+        return
+    data = await state.get_data()
+    bot_id = data['bot_id']
+    
+    # Keyingi sahifalar uchun so'rov saqlanadi, holat esa tozalanadi
+    await state.set_state(None)
+    await state.update_data(log_query=message.text)
+    
+    text, kb = await build_log_search_page(bot_id, message.text, None)
+    await message.answer(text, reply_markup=kb)
+
+@dp.callback_query(F.data.startswith("logfind_"))
+async def cb_log_search_page(callback: types.CallbackQuery, state: FSMContext):
+    parts = callback.data.split("_")
+    bot_id = int(parts[1])
+    cursor = int(parts[2])
+    query = (await state.get_data()).get('log_query')
+    if not query:
+        await callback.answer("Qidiruv muddati o'tgan, qaytadan qidiring.", show_alert=True)
+        return
+    
+    text, kb = await build_log_search_page(bot_id, query, cursor)
+    await callback.message.edit_text(text, reply_markup=kb)
+
+def shorten(text, limit):
+    text = str(text)
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+def env_key_ref(key):
+    """callback_data uchun kalit: ENV_KEY_PATTERN ga mos kelmaydigan (masalan, migratsiya qilingan
+    uzun) kalitlar o'rniga "#" va xeshi ishlatiladi, aks holda 64 baytdan oshib, butun klaviatura rad etiladi"""
+    if ENV_KEY_PATTERN.fullmatch(key):
+        return key
+    return "#" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
 @dp.callback_query(F.data.startswith("env_list_"))
 async def cb_env_list(callback: types.CallbackQuery):
     bot_id = int(callback.data.split("_")[2])
-    bot_data = db.get_bot(bot_id)
-    env_vars = json.loads(bot_data[6]) if bot_data[6] else {}
+    bot_data = await db.get_bot(bot_id)
+    env_vars = await db.get_env_vars(bot_id)
     
     kb = InlineKeyboardBuilder()
-    for key, value in env_vars.items():
-        kb.button(text=f"❌ {key}", callback_data=f"env_del_{bot_id}_{key}")
+    for key in env_vars:
+        kb.button(text=f"❌ {shorten(key, ENV_KEY_PREVIEW)}", callback_data=f"env_del_{bot_id}_{env_key_ref(key)}")
     
-    if len(env_vars) < 5:
+    if len(env_vars) < ENV_VARS_MAX:
         kb.button(text="➕ Yangi qo'shish", callback_data=f"env_add_{bot_id}")
     
     kb.button(text="⬅️ Orqaga", callback_data=f"manage_{bot_id}")
     kb.adjust(1)
     
-    env_text = "\n".join([f"<code>{k}</code> = <code>{v}</code>" for k, v in env_vars.items()]) or "Hali o'zgaruvchilar yo'q."
+    env_text = "\n".join(
+        f"<code>{html.escape(shorten(k, ENV_KEY_PREVIEW))}</code> = <code>{html.escape(shorten(v, ENV_VALUE_PREVIEW))}</code>"
+        for k, v in env_vars.items()
+    ) or "Hali o'zgaruvchilar yo'q."
     
     await callback.message.edit_text(
-        f"⚙️ Bot: {bot_data[2]}\n\n"
-        f"Environment Variables (maks 5 ta):\n\n{env_text}",
+        f"⚙️ Bot: {bot_data.name}\n\n"
+        f"Environment Variables (maks {ENV_VARS_MAX} ta):\n\n{env_text}",
         reply_markup=kb.as_markup(),
         parse_mode="HTML"
     )
@@ -381,25 +909,29 @@ async def cb_env_add(callback: types.CallbackQuery, state: FSMContext):
 
 @dp.message(ManageEnv.waiting_for_env_key)
 async def process_env_key(message: types.Message, state: FSMContext):
+    if not message.text or not ENV_KEY_PATTERN.fullmatch(message.text):
+        await message.answer("❌ Nom faqat lotin harflari, raqamlar va '_' dan iborat bo'lishi (raqam bilan boshlanmasligi), 32 belgidan oshmasligi kerak. Qayta kiriting:")
+        return
     await state.update_data(env_key=message.text)
     await state.set_state(ManageEnv.waiting_for_env_value)
     await message.answer(f"'{message.text}' uchun qiymatni (VALUE) kiriting:")
 
 @dp.message(ManageEnv.waiting_for_env_value)
 async def process_env_value(message: types.Message, state: FSMContext):
+    if not message.text:
+        await message.answer("❌ Qiymat matn ko'rinishida bo'lishi kerak. Qayta kiriting:")
+        return
     data = await state.get_data()
     bot_id = data['bot_id']
     key = data['env_key']
     value = message.text
     
-    bot_data = db.get_bot(bot_id)
-    env_vars = json.loads(bot_data[6]) if bot_data[6] else {}
+    env_vars = await db.get_env_vars(bot_id)
     
-    if len(env_vars) >= 5:
-        await message.answer("❌ Maksimal 5 ta o'zgaruvchi qo'shish mumkin!")
+    if key not in env_vars and len(env_vars) >= ENV_VARS_MAX:
+        await message.answer(f"❌ Maksimal {ENV_VARS_MAX} ta o'zgaruvchi qo'shish mumkin!")
     else:
-        env_vars[key] = value
-        db.update_env_vars(bot_id, env_vars)
+        await db.set_env_var(bot_id, key, value)
         await message.answer(f"✅ '{key}'='{value}' qo'shildi!")
     
     await state.clear()
@@ -412,16 +944,19 @@ async def process_env_value(message: types.Message, state: FSMContext):
 
 @dp.callback_query(F.data.startswith("env_del_"))
 async def cb_env_del(callback: types.CallbackQuery):
-    parts = callback.data.split("_")
+    # Kalitning o'zida ham "_" bo'lishi mumkin (masalan, API_KEY)
+    parts = callback.data.split("_", 3)
     bot_id = int(parts[2])
     key_to_del = parts[3]
-    
-    bot_data = db.get_bot(bot_id)
-    env_vars = json.loads(bot_data[6]) if bot_data[6] else {}
-    
-    if key_to_del in env_vars:
-        del env_vars[key_to_del]
-        db.update_env_vars(bot_id, env_vars)
+    if key_to_del.startswith("#"):
+        # Uzun (eski bazadan ko'chirilgan) kalit xesh orqali topiladi
+        env_vars = await db.get_env_vars(bot_id)
+        key_to_del = next((key for key in env_vars if env_key_ref(key) == key_to_del), None)
+        if key_to_del is None:
+            await cb_env_list(callback)
+            return
+    
+    if await db.delete_env_var(bot_id, key_to_del):
         await callback.answer(f"'{key_to_del}' o'chirildi")
     
     await cb_env_list(callback)
@@ -429,15 +964,15 @@ async def cb_env_del(callback: types.CallbackQuery):
 @dp.callback_query(F.data.startswith("files_"))
 async def cb_file_manager(callback: types.CallbackQuery):
     bot_id = int(callback.data.split("_")[1])
-    bot_data = db.get_bot(bot_id)
-    bot_path = os.path.join("hosted_bots", bot_data[5])
+    bot_data = await db.get_bot(bot_id)
+    bot_path = os.path.join("hosted_bots", bot_data.path)
     
     files = [f for f in os.listdir(bot_path) if os.path.isfile(os.path.join(bot_path, f))]
     
     kb = InlineKeyboardBuilder()
     for f in files:
-        # Log faylini tahrirlash shart emas
-        if f == "bot.log": continue
+        # Log fayli va yashirin xizmat fayllarini (kesh va h.k.) tahrirlash shart emas
+        if f.startswith(("bot.log", ".")): continue
         kb.button(text=f"📄 {f}", callback_data=f"fedit_{bot_id}_{f}")
     
     kb.button(text="➕ Fayl qo'shish", callback_data=f"fadd_{bot_id}")
@@ -445,7 +980,7 @@ async def cb_file_manager(callback: types.CallbackQuery):
     kb.adjust(1)
     
     await callback.message.edit_text(
-        f"📂 Bot: {bot_data[2]}\nFayllar ro'yxati (tahrirlash uchun tanlang):",
+        f"📂 Bot: {bot_data.name}\nFayllar ro'yxati (tahrirlash uchun tanlang):",
         reply_markup=kb.as_markup()
     )
 
@@ -454,8 +989,8 @@ async def cb_file_edit_start(callback: types.CallbackQuery, state: FSMContext):
     parts = callback.data.split("_")
     bot_id = int(parts[1])
     filename = parts[2]
-    bot_data = db.get_bot(bot_id)
-    file_path = os.path.join("hosted_bots", bot_data[5], filename)
+    bot_data = await db.get_bot(bot_id)
+    file_path = os.path.join("hosted_bots", bot_data.path, filename)
     
     # Matnli fayllarni tekshirish
     text_exts = ['.py', '.txt', '.json', '.html', '.css', '.js', '.md']
@@ -483,8 +1018,8 @@ async def process_file_edit(message: types.Message, state: FSMContext):
     data = await state.get_data()
     bot_id = data['bot_id']
     filename = data['filename']
-    bot_data = db.get_bot(bot_id)
-    file_path = os.path.join("hosted_bots", bot_data[5], filename)
+    bot_data = await db.get_bot(bot_id)
+    file_path = os.path.join("hosted_bots", bot_data.path, filename)
     
     try:
         with open(file_path, 'w', encoding='utf-8') as f:
@@ -507,9 +1042,9 @@ async def cb_file_add_start(callback: types.CallbackQuery, state: FSMContext):
 async def process_edit_code(message: types.Message, state: FSMContext):
     data = await state.get_data()
     bot_id = data['bot_id']
-    bot_data = db.get_bot(bot_id)
+    bot_data = await db.get_bot(bot_id)
     
-    main_file = os.path.join("hosted_bots", bot_data[5], "main.py")
+    main_file = os.path.join("hosted_bots", bot_data.path, "main.py")
     
     try:
         with open(main_file, 'w', encoding='utf-8') as f:
@@ -525,9 +1060,9 @@ async def process_edit_code(message: types.Message, state: FSMContext):
 @dp.callback_query(F.data.startswith("edit_req_"))
 async def cb_edit_req(callback: types.CallbackQuery, state: FSMContext):
     bot_id = int(callback.data.split("_")[2])
-    bot_data = db.get_bot(bot_id)
+    bot_data = await db.get_bot(bot_id)
     
-    req_file = os.path.join("hosted_bots", bot_data[5], "requirements.txt")
+    req_file = os.path.join("hosted_bots", bot_data.path, "requirements.txt")
     content = ""
     if os.path.exists(req_file):
         with open(req_file, 'r', encoding='utf-8') as f:
@@ -538,7 +1073,7 @@ async def cb_edit_req(callback: types.CallbackQuery, state: FSMContext):
     
     req_preview = content if content else "Bo'sh"
     await callback.message.edit_text(
-        f"📦 Bot: {bot_data[2]}\n\n"
+        f"📦 Bot: {bot_data.name}\n\n"
         f"Hozirgi requirements.txt:\n<pre>{req_preview}</pre>\n\n"
         "Yangi kutubxonalar ro'yxatini yuboring (har bir qatorda bittadan):",
         parse_mode="HTML"
@@ -548,9 +1083,9 @@ async def cb_edit_req(callback: types.CallbackQuery, state: FSMContext):
 async def process_edit_req(message: types.Message, state: FSMContext):
     data = await state.get_data()
     bot_id = data['bot_id']
-    bot_data = db.get_bot(bot_id)
+    bot_data = await db.get_bot(bot_id)
     
-    req_file = os.path.join("hosted_bots", bot_data[5], "requirements.txt")
+    req_file = os.path.join("hosted_bots", bot_data.path, "requirements.txt")
     
     try:
         with open(req_file, 'w', encoding='utf-8') as f:
@@ -566,22 +1101,75 @@ async def process_edit_req(message: types.Message, state: FSMContext):
 @dp.callback_query(F.data.startswith("delete_"))
 async def cb_delete_bot(callback: types.CallbackQuery):
     bot_id = int(callback.data.split("_")[1])
-    bot_data = db.get_bot(bot_id)
+    bot_data = await db.get_bot(bot_id)
     
     # Avval to'xtatamiz
-    manager.stop_bot(bot_id)
+    await manager.stop_bot(bot_id)
     
     # Fayllarni o'chiramiz
-    full_path = os.path.join("hosted_bots", bot_data[5])
+    full_path = os.path.join("hosted_bots", bot_data.path)
     if os.path.exists(full_path):
         shutil.rmtree(full_path)
     
     # DB dan o'chiramiz
-    db.delete_bot(bot_id)
+    await db.delete_bot(bot_id)
     
     await callback.answer("✅ Bot o'chirildi")
     await cb_my_bots(callback)
 
+async def on_bot_status(bot_id, status):
+    """Kuzatuvchi (supervisor) bot holatini o'zgartirganda chaqiriladi"""
+    await db.update_bot_status(bot_id, status, *manager.process_identity(bot_id), wait=False)
+
+async def on_bot_event(bot_id, text):
+    """Kuzatuvchi xabarlarini bot egasiga yuboradi"""
+    bot_data = await db.get_bot(bot_id)
+    if not bot_data:
+        return
+    kb = InlineKeyboardBuilder()
+    kb.button(text="📜 Loglar", callback_data=f"logs_{bot_id}")
+    kb.button(text="⚙️ Boshqarish", callback_data=f"manage_{bot_id}")
+    kb.adjust(2)
+    await bot.send_message(bot_data.owner_id, f"🤖 Bot: {bot_data.name}\n\n{text}", reply_markup=kb.as_markup())
+
+async def reconcile_bots():
+    """Boshqaruvchi qayta ishga tushganda bazada ishlayotgan deb belgilangan botlarni tiklaydi.
+
+    Hali tirik jarayonlar PID bo'yicha qabul qilinadi, lekin ularning chiqish pipe'i eski
+    boshqaruvchi bilan yopilgan (loglar yozilmaydi). Shuning uchun ular ham navbat orqali
+    (START_WORKERS tadan parallel) to'g'ri to'xtatilib, yangi pipe bilan qayta ishga tushiriladi.
+    """
+    bots = await db.get_bots_by_status(ACTIVE_STATUSES)
+    adopted = 0
+    for b in bots:
+        env_vars = await db.get_env_vars(b.id)
+        is_adopted = manager.adopt(b.id, b.pid, b.pid_start, b.path, b.token, env_vars, BotLimits.from_record(b))
+        if is_adopted:
+            adopted += 1
+        job_queue.submit(("start", b.id), make_resume_job(b, env_vars, is_adopted))
+    if bots:
+        print(f"♻️ {len(bots)} ta bot tiklanmoqda: {adopted} tasi hali ishlayapti (loglarni ulash uchun "
+              f"qayta ishga tushiriladi), {len(bots) - adopted} tasi ishga tushiriladi")
+
+def make_resume_job(bot_data, env_vars, adopted=False):
+    async def job(progress):
+        if adopted:
+            stopped, msg = await manager.stop_bot(bot_data.id)
+            if not stopped and bot_data.id in manager.processes:
+                # Bot ishlashda davom etadi, lekin chiqishi logga yozilmaydi - egasi bilsin
+                await on_bot_event(bot_data.id, f"⚠️ Bot ishlayapti, lekin xizmat qayta ishga tushgani uchun "
+                                                f"uning loglari yozilmayapti. Botni qo'lda qayta ishga "
+                                                f"tushiring ({msg}).")
+                return
+        success, msg = await manager.start_bot(bot_data.id, bot_data.path, bot_data.token, env_vars,
+                                               resume=True, limits=BotLimits.from_record(bot_data))
+        if success:
+            await db.update_bot_status(bot_data.id, "running", *manager.process_identity(bot_data.id))
+        else:
+            await db.update_bot_status(bot_data.id, "stopped")
+            await on_bot_event(bot_data.id, f"❌ Xizmat qayta ishga tushgach botni tiklab bo'lmadi: {msg}")
+    return job
+
 async def main():
     print("--- Hosting Bot ishga tushmoqda... ---")
     
@@ -593,11 +1181,34 @@ async def main():
     # Ma'lumotlar bazasini tekshirish
     print("📊 Ma'lumotlar bazasi yuklandi")
     
+    # Bot jarayonlari kuzatuvchisidan keladigan xabarlar
+    manager.on_status = on_bot_status
+    manager.on_event = on_bot_event
+    
+    # Ishga tushirish navbatining worker'lari
+    job_queue.start()
+    
+    # Oldin ishlayotgan botlarni tiklash
+    await reconcile_bots()
+    
+    # Botlarning CPU/RAM iste'molini o'lchab borish
+    sampler_task = asyncio.create_task(sampler.run())
+    
+    # Mashhur steklar uchun muhit shablonlarini fonda tayyorlash
+    warmup_task = asyncio.create_task(manager.store.warm_templates())
+    
     bot_info = await bot.get_me()
     print(f"--- Bot muvaffaqiyatli ulandi: @{bot_info.username} ---")
     print(f"--- Bot ID: {bot_info.id} ---")
     
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await job_queue.stop()
+        if STOP_BOTS_ON_EXIT and manager.processes:
+            print(f"⏹ {len(manager.processes)} ta bot to'xtatilmoqda...")
+            await manager.stop_all()
+        await db.close()
 
 if __name__ == "__main__":
     try:
@@ -608,4 +1219,4 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logging.info("Bot to'xtatildi")
     except Exception as e:
-        logging.error(f"Xatolik: {e}")  logging.error(f"Xatolik: {e}")
\ No newline at end of file
+        logging.error(f"Xatolik: {e}")
\ No newline at end of file
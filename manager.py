@@ -1,10 +1,191 @@
-﻿import subprocess
+﻿import abc
+import asyncio
+import hashlib
+import subprocess
 import os
+import re
 import signal
 import logging
 import sys
 import time
 from dependency_detector import detect_dependencies
+from log_manager import LOG_TAIL_BYTES, RotatingLogWriter, pump_output, tail_lines
+from package_store import PackageStore, normalize_requirements, venv_python
+from resource_limits import BotLimits, CgroupLimiter, apply_limits
+
+# pip install uchun maksimal vaqt (soniya)
+PIP_TIMEOUT = 180
+# Tayyorlik kutiladigan eng uzun vaqt (soniya). Shu vaqt ichida bot o'chmasa va tayyorlik
+# belgisi chiqarmasa ham, ishga tushgan deb hisoblanadi.
+STARTUP_CHECK_SECONDS = float(os.getenv("BOT_READY_TIMEOUT", os.getenv("BOT_STARTUP_CHECK", "5")))
+# Bot chiqishida shulardan biri uchrasa, u darhol tayyor deb hisoblanadi (katta-kichik harf farqlanadi).
+# aiogram 3 "Run polling for bot ..." ni getMe muvaffaqiyatli bo'lgandan keyin yozadi; boshqa
+# kutubxonalardagi botlar BOT_READY chiqarishi mumkin. "Bot ishga tushdi" kabi oddiy matnlar
+# kiritilmagan: ular ko'pincha token tekshirilmasdan oldin chiqariladi.
+READY_MARKERS = re.compile(os.getenv("BOT_READY_MARKERS", r"Run polling for bot|BOT_READY").encode("utf-8"))
+# PEP 263 encoding deklaratsiyasi
+CODING_COOKIE = re.compile(r"^[ \t\f]*#.*?coding[:=]")
+# Oxirgi muvaffaqiyatli o'rnatilgan requirements barmoq izi (bot papkasida)
+INSTALL_LOCK_FILE = ".install_lock"
+# Har bir botning alohida muhiti (bot papkasi ichida)
+VENV_DIR = ".venv"
+# To'xtatishda SIGTERM dan keyin SIGKILL gacha kutish va SIGKILL dan keyin reap kutish (soniya)
+STOP_GRACE_SECONDS = float(os.getenv("BOT_STOP_GRACE", "10"))
+STOP_KILL_TIMEOUT = 5
+# Kutilmaganda to'xtagan botni qayta ishga tushirish: birinchi kutish va eng uzun kutish (soniya)
+RESTART_BACKOFF = float(os.getenv("BOT_RESTART_BACKOFF", "1"))
+RESTART_BACKOFF_MAX = float(os.getenv("BOT_RESTART_BACKOFF_MAX", "300"))
+# Shundan kam ishlab to'xtagan bot "tez qulagan" hisoblanadi (soniya)
+CRASH_WINDOW_SECONDS = float(os.getenv("BOT_CRASH_WINDOW", "60"))
+# Ketma-ket shuncha tez qulashdan keyin bot crash-loop deb belgilanadi va qayta ishga tushirilmaydi
+CRASH_LOOP_LIMIT = int(os.getenv("BOT_CRASH_LOOP_LIMIT", "5"))
+
+def process_start_time(pid):
+    """Jarayon boshlangan vaqt (/proc/<pid>/stat, 22-maydon). PID qayta ishlatilganini aniqlash uchun."""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            stat = f.read()
+        # 2-maydon (comm) ichida bo'sh joy va qavslar bo'lishi mumkin
+        return int(stat.rsplit(")", 1)[1].split()[19])
+    except (OSError, ValueError, IndexError):
+        return None
+
+def open_pidfd(pid):
+    """Jarayon uchun pidfd (Linux 5.3+), qo'llab-quvvatlanmasa None. Jarayon yo'q bo'lsa ProcessLookupError."""
+    try:
+        return os.pidfd_open(pid)
+    except (AttributeError, OSError) as e:
+        if isinstance(e, ProcessLookupError):
+            raise
+        return None
+
+class WatchedProcess(abc.ABC):
+    """Asosiy jarayon tugashini pidfd orqali (bo'lmasa sekin tekshiruv bilan) kutadi.
+
+    asyncio'dagi Process.wait() stdout pipe'i yopilishini ham kutadi: bot ishga tushirgan
+    bola jarayon pipe'ni ochiq ushlab qolsa, asosiy jarayon tugagani sezilmaydi. Bu yerda
+    faqat asosiy jarayonning o'zi kuzatiladi.
+    """
+
+    def __init__(self, pid, pidfd):
+        self.pid = pid
+        self._pidfd = pidfd
+        self._exited = None
+
+    async def wait(self):
+        if self._exited is None:
+            loop = asyncio.get_running_loop()
+            self._exited = loop.create_future()
+            if self._pidfd is not None:
+                loop.add_reader(self._pidfd, self._on_exit)
+            else:
+                asyncio.create_task(self._poll())
+        await asyncio.shield(self._exited)
+        return await self._collect()
+
+    def _on_exit(self):
+        loop = asyncio.get_running_loop()
+        loop.remove_reader(self._pidfd)
+        os.close(self._pidfd)
+        self._pidfd = None
+        if not self._exited.done():
+            self._exited.set_result(None)
+
+    async def _poll(self):
+        while self._alive():
+            await asyncio.sleep(1)
+        if not self._exited.done():
+            self._exited.set_result(None)
+
+    @abc.abstractmethod
+    def _alive(self):
+        """Jarayon hali ishlayaptimi (pidfd bo'lmaganda sekin tekshiruv uchun)"""
+
+    @abc.abstractmethod
+    async def _collect(self):
+        """Jarayon tugagandan keyin chiqish kodini qaytaradi"""
+
+    def send_signal(self, sig):
+        os.kill(self.pid, sig)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+class BotProcess(WatchedProcess):
+    """Boshqaruvchi o'zi ishga tushirgan bot jarayoni (asyncio.subprocess.Process ustida).
+
+    Jarayonni asyncio child watcher reap qiladi va chiqish kodini o'rnatadi.
+    """
+
+    def __init__(self, process):
+        try:
+            pidfd = open_pidfd(process.pid)
+        except ProcessLookupError:
+            pidfd = None  # allaqachon tugab reap qilingan
+        super().__init__(process.pid, pidfd)
+        self.stdout = process.stdout
+        self._process = process
+
+    @property
+    def returncode(self):
+        return self._process.returncode
+
+    def _alive(self):
+        return self._process.returncode is None
+
+    async def _collect(self):
+        # pidfd jarayon zombie bo'lganda tayyor bo'ladi, child watcher uni birozdan keyin reap qiladi
+        while self._process.returncode is None:
+            await asyncio.sleep(0.01)
+        return self._process.returncode
+
+    def send_signal(self, sig):
+        self._process.send_signal(sig)
+
+    def terminate(self):
+        self._process.terminate()
+
+    def kill(self):
+        self._process.kill()
+
+class AdoptedProcess(WatchedProcess):
+    """Oldingi boshqaruvchi ishga tushirgan va hali ishlayotgan bot jarayoni.
+
+    Jarayon bizning bolamiz emas: uni init reap qiladi va chiqish kodini bilib bo'lmaydi.
+    Jarayonning stdout pipe'i eski boshqaruvchi bilan birga yopilgan, shuning uchun
+    chiqishi logga yozilmaydi - main.py uni qabul qilgach to'xtatib, qayta ishga tushiradi.
+    """
+
+    def __init__(self, pid):
+        super().__init__(pid, open_pidfd(pid))
+        self.returncode = None
+        self.stdout = None
+
+    def _alive(self):
+        try:
+            os.kill(self.pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    async def _collect(self):
+        self.returncode = -1  # haqiqiy kod noma'lum
+        return self.returncode
+
+def requirements_fingerprint(req_file, python_cmd):
+    """Requirements to'plami va interpretator versiyasidan barmoq izi hisoblaydi
+    (requirements.txt bo'lmasa - bo'sh to'plam)"""
+    digest = hashlib.sha256()
+    digest.update(f"{python_cmd}\n{sys.version}\n".encode("utf-8"))
+    requirements = normalize_requirements(req_file) if os.path.exists(req_file) else []
+    for requirement in requirements:
+        digest.update(requirement.encode("utf-8") + b"\n")
+    return digest.hexdigest()
 
 class BotManager:
     def __init__(self, base_path="hosted_bots"):
@@ -12,6 +193,18 @@ class BotManager:
         if not os.path.exists(self.base_path):
             os.makedirs(self.base_path)
         self.processes = {}  # bot_id: process_object
+        # Barcha botlar uchun umumiy paketlar ombori
+        self.store = PackageStore(os.path.join(self.base_path, ".store"), pip_timeout=PIP_TIMEOUT)
+        self.starting = set()  # hozir ishga tushirilayotgan bot_id lar
+        self.log_tasks = {}  # bot_id: chiqishni logga yozuvchi vazifa
+        self.specs = {}  # bot_id: (bot_path, token, env_vars, limits) - qayta ishga tushirish uchun
+        self.cgroups = CgroupLimiter()
+        self.supervisors = {}  # bot_id: jarayonni kuzatuvchi vazifa
+        # Kuzatuvchi xabarlari uchun async callback'lar (main.py ulaydi):
+        # on_status(bot_id, status) - "running", "restarting", "crashloop", "stopped"
+        # on_event(bot_id, text) - bot egasiga yuboriladigan xabar
+        self.on_status = None
+        self.on_event = None
 
     def clean_python_file(self, file_path):
         """Python faylini requirements.txt dan tozalaydi"""
@@ -79,11 +272,17 @@ class BotManager:
                 try:
                     decoded_content = raw_content.decode(encoding)
                     
+                    # Eski encoding deklaratsiyasi (birinchi ikki qatorda) o'rniga bittasini yozamiz,
+                    # shuning uchun qayta tayyorlashda sarlavhalar ko'payib ketmaydi
+                    lines = decoded_content.splitlines(keepends=True)
+                    head = [line for line in lines[:2] if not CODING_COOKIE.match(line)]
+                    lines = head + lines[2:]
+                    position = 1 if lines and lines[0].startswith('#!') else 0
+                    lines.insert(position, '# -*- coding: utf-8 -*-\n')
+
                     # Faylni UTF-8 bilan qayta yozish
                     with open(file_path, 'w', encoding='utf-8') as f:
-                        # Encoding deklaratsiyasini qo'shamiz
-                        f.write('# -*- coding: utf-8 -*-\n')
-                        f.write(decoded_content)
+                        f.write(''.join(lines))
                     
                     return True
                 except UnicodeDecodeError:
@@ -112,20 +311,21 @@ class BotManager:
             logging.error(f"Encoding tuzatishda xatolik: {e}")
             return False
 
-    def start_bot(self, bot_id, bot_path, token, env_vars=None):
-        if bot_id in self.processes:
-            return False, "Bot allaqachon ishlayapti"
-
-        full_path = os.path.join(self.base_path, bot_path)
+    def find_main_file(self, full_path):
+        """Botning asosiy fayli: main.py, bo'lmasa birinchi uchragan .py fayl"""
         main_file = os.path.join(full_path, "main.py")
-        
-        # Agar main.py bo'lmasa, birinchi uchragan .py faylni main deb olamiz
-        if not os.path.exists(main_file):
-            py_files = [f for f in os.listdir(full_path) if f.endswith('.py')]
-            if py_files:
-                main_file = os.path.join(full_path, py_files[0])
-            else:
-                return False, "Hech qanday .py fayl topilmadi"
+        if os.path.exists(main_file):
+            return main_file
+        py_files = [f for f in os.listdir(full_path) if f.endswith('.py')]
+        if py_files:
+            return os.path.join(full_path, py_files[0])
+        return None
+
+    def prepare_main_file(self, full_path, token):
+        """Asosiy faylni topadi, tozalaydi va tokenni yozadi (1-3 qadamlar)"""
+        main_file = self.find_main_file(full_path)
+        if main_file is None:
+            return None
 
         # 1. Avval BOM ni olib tashlash
         try:
@@ -154,6 +354,9 @@ class BotManager:
             lines = content.split('\n')
             new_lines = []
             token_written = False
+            # Fayl oldin tayyorlangan bo'lsa TOKEN qatori allaqachon bor - yana qo'shilmaydi
+            has_token = any((line.strip().startswith('TOKEN') and '=' in line and 'telebot' not in line)
+                            or 'TOKEN = os.getenv' in line for line in lines)
             
             for line in lines:
                 if line.strip().startswith('TOKEN') and ('=' in line) and ('telebot' not in line):
@@ -169,7 +372,7 @@ class BotManager:
                 elif line.strip().startswith('import telebot'):
                     # telebot importidan keyin token qatorini qo'shish
                     new_lines.append(line)
-                    if not token_written:
+                    if not token_written and not has_token:
                         new_lines.append('')
                         new_lines.append(f'TOKEN = "{token}"')
                         token_written = True
@@ -195,16 +398,10 @@ class BotManager:
         except Exception as e:
             logging.error(f"Token yozishda xatolik: {e}")
 
-        # 4. Environment variables
-        env = os.environ.copy()
-        env["BOT_TOKEN"] = token
-        if env_vars:
-            env.update(env_vars)
+        return main_file
 
-        log_file_path = os.path.join(full_path, "bot.log")
-        log_file = open(log_file_path, "a", encoding="utf-8")
-        
-        # 5. Avtomatik dependency tahlili va requirements.txt ni yangilash
+    def update_requirements(self, full_path, log_file):
+        """Aniqlangan kutubxonalarni requirements.txt ga qo'shadi (5-qadam)"""
         log_file.write("🔍 Bot kodi tahlil qilinmoqda va kerakli kutubxonalar aniqlanmoqda...\n")
         log_file.flush()
         try:
@@ -243,115 +440,437 @@ class BotManager:
             log_file.write(f"⚠️ Tahlil jarayonida xatolik: {e}\n")
         log_file.flush()
 
-        # 6. Kutubxonalarni o'rnatish
+    def read_install_lock(self, full_path):
         try:
-            log_file.write("📥 Kutubxonalar o'rnatilmoqda...\n")
-            log_file.flush()
+            with open(os.path.join(full_path, INSTALL_LOCK_FILE), "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def write_install_lock(self, full_path, fingerprint):
+        lock_path = os.path.join(full_path, INSTALL_LOCK_FILE)
+        try:
+            if fingerprint is None:
+                if os.path.exists(lock_path):
+                    os.remove(lock_path)
+            else:
+                with open(lock_path, "w", encoding="utf-8") as f:
+                    f.write(fingerprint)
+        except OSError as e:
+            logging.error(f"Install lock yozishda xatolik: {e}")
+
+    async def install_requirements(self, full_path, log_file, progress=None):
+        """Bot uchun alohida venv tayyorlaydi va requirements.txt dagi kutubxonalarni
+        umumiy ombordan ulaydi (6-qadam). Event loop bloklanmaydi.
+
+        Requirements oxirgi muvaffaqiyatli o'rnatishdan beri o'zgarmagan bo'lsa, pip ishlatilmaydi.
+        """
+        venv_dir = os.path.join(full_path, VENV_DIR)
+        try:
+            created = await asyncio.to_thread(self.store.ensure_venv, venv_dir)
+            if created:
+                log_file.write("🧪 Bot uchun alohida muhit (venv) yaratildi.\n")
             
             req_file = os.path.join(full_path, "requirements.txt")
+            python_cmd = venv_python(venv_dir)
+            fingerprint = await asyncio.to_thread(requirements_fingerprint, req_file, python_cmd)
             if os.path.exists(req_file):
-                result = subprocess.run(
-                    [sys.executable, "-m", "pip", "install", "-r", req_file],
-                    capture_output=True,
-                    text=True,
-                    timeout=180,
-                    cwd=full_path
-                )
-                if result.returncode == 0:
-                    log_file.write("✅ Barcha kutubxonalar muvaffaqiyatli o'rnatildi.\n")
+                if not created and fingerprint == self.read_install_lock(full_path):
+                    log_file.write("ℹ️ Kutubxonalar o'zgarmagan, o'rnatish o'tkazib yuborildi.\n")
+                    log_file.flush()
+                    return
+
+                # Mashhur steklar uchun tayyor shablondan nusxa olinadi
+                requirements = await asyncio.to_thread(normalize_requirements, req_file)
+                hashes = self.store.match_template(requirements)
+                if hashes is not None:
+                    log_file.write("⚡ Tayyor muhit shablonidan foydalanilmoqda...\n")
                 else:
-                    log_file.write(f"⚠️ Ba'zi kutubxonalarni o'rnatishda xatolik: {result.stderr}\n")
+                    await self._report(progress, "📥 Kutubxonalar o'rnatilmoqda...")
+                    log_file.write("📥 Kutubxonalar o'rnatilmoqda...\n")
+                    log_file.flush()
+                    hashes = await self.store.resolve(req_file)
+                await asyncio.to_thread(self.store.link, venv_dir, hashes)
+                self.write_install_lock(full_path, fingerprint)
+                log_file.write(f"✅ Barcha kutubxonalar muvaffaqiyatli o'rnatildi ({len(hashes)} ta paket).\n")
             else:
+                # Kutubxonasiz bot ham tayyor hisoblanadi (qayta tiklashda tahlil o'tkazib yuboriladi)
+                self.write_install_lock(full_path, fingerprint)
                 log_file.write("ℹ️ requirements.txt topilmadi, o'rnatish o'tkazib yuborildi.\n")
         except Exception as e:
+            self.write_install_lock(full_path, None)
             log_file.write(f"❌ O'rnatishda xatolik: {e}\n")
         log_file.flush()
+
+    async def start_bot(self, bot_id, bot_path, token, env_vars=None, progress=None, resume=False, limits=None):
+        """Botni ishga tushiradi. Barcha og'ir ishlar event loop'dan tashqarida bajariladi.
+
+        progress - har bir bosqich matnini qabul qiluvchi async funksiya (ixtiyoriy).
+        resume=True - avval ishlagan botni tiklash: muhit tayyor bo'lsa, fayllarni tayyorlash
+        va kutubxonalarni tekshirish o'tkazib yuboriladi.
+        limits - BotLimits (berilmasa standart cheklovlar).
+        """
+        if bot_id in self.processes or bot_id in self.starting:
+            return False, "Bot allaqachon ishlayapti"
+
+        self.starting.add(bot_id)
+        try:
+            # Qo'lda ishga tushirish kutilayotgan avtomatik qayta ishga tushirishni bekor qiladi
+            self._cancel_supervisor(bot_id)
+            limits = limits or BotLimits()
+            self.specs[bot_id] = (bot_path, token, dict(env_vars or {}), limits)
+            success, msg = await self._start_bot(bot_id, bot_path, token, env_vars, progress, resume, limits)
+            if success:
+                self._supervise(bot_id)
+            return success, msg
+        finally:
+            self.starting.discard(bot_id)
+
+    def _supervise(self, bot_id):
+        task = asyncio.create_task(self._supervisor(bot_id))
+        self.supervisors[bot_id] = task
+        task.add_done_callback(lambda task: self._forget_supervisor(bot_id, task))
+
+    def _forget_supervisor(self, bot_id, task):
+        if self.supervisors.get(bot_id) is task:
+            del self.supervisors[bot_id]
+
+    def _cancel_supervisor(self, bot_id):
+        task = self.supervisors.pop(bot_id, None)
+        if task and task is not asyncio.current_task():
+            task.cancel()
+            return True
+        return False
+
+    async def _notify(self, callback, bot_id, value):
+        if callback is None:
+            return
+        try:
+            await callback(bot_id, value)
+        except Exception as e:
+            logging.error(f"Bot {bot_id} kuzatuvchi xabarini yuborib bo'lmadi: {e}")
+
+    async def _supervisor(self, bot_id):
+        """Bot jarayoni tugashini kutadi (polling'siz, pidfd orqali).
+
+        Jarayon stop_bot'siz tugasa, bot eksponensial kutish bilan qayta ishga tushiriladi.
+        CRASH_LOOP_LIMIT marta ketma-ket tez qulagan bot crash-loop deb belgilanadi.
+        Kuzatuvchi kutilmagan xato bilan tugasa, bot to'xtatiladi va "stopped" deb belgilanadi:
+        holat "restarting" da qolib ketsa, botni UI dan boshqarib bo'lmaydi.
+        """
+        try:
+            await self._watch(bot_id)
+        except Exception as e:
+            logging.error(f"Bot {bot_id} kuzatuvchisi xato bilan tugadi: {e}")
+            await self.stop_bot(bot_id)
+            await self._notify(self.on_status, bot_id, "stopped")
+            await self._notify(self.on_event, bot_id,
+                               f"❌ Botni kuzatishda xatolik: {e}. Bot to'xtatildi, uni qo'lda ishga tushiring.")
+
+    async def _watch(self, bot_id):
+        failures = 0
+        while True:
+            process = self.processes.get(bot_id)
+            if process is None:
+                return
+            started = time.monotonic()
+            code = await process.wait()
+            if self.processes.get(bot_id) is not process:
+                return  # stop_bot orqali to'xtatilgan
+            del self.processes[bot_id]
+            uptime = time.monotonic() - started
+            failures = failures + 1 if uptime < CRASH_WINDOW_SECONDS else 1
+            logging.warning(f"Bot {bot_id} kutilmaganda to'xtadi (kod {code}, {uptime:.0f} soniya ishladi)")
+            await self._reap_group(bot_id, process)
+            breach = await asyncio.to_thread(self.limit_breach, bot_id)
+            await asyncio.to_thread(self.cgroups.remove, bot_id)
+            reason = f"kod {code}" + (f", {breach}" if breach else "")
+
+            while True:
+                if failures >= CRASH_LOOP_LIMIT:
+                    await self._notify(self.on_status, bot_id, "crashloop")
+                    await self._notify(self.on_event, bot_id,
+                                       f"🔁 Bot ketma-ket {failures} marta tez to'xtadi va qayta ishga "
+                                       f"tushirilmaydi. Loglarni tekshirib, botni qo'lda ishga tushiring.")
+                    return
+
+                delay = min(RESTART_BACKOFF * 2 ** (failures - 1), RESTART_BACKOFF_MAX)
+                await self._notify(self.on_status, bot_id, "restarting")
+                await self._notify(self.on_event, bot_id,
+                                   f"⚠️ Bot to'xtab qoldi ({reason}). {delay:g} soniyadan keyin "
+                                   f"qayta ishga tushiriladi.")
+                await asyncio.sleep(delay)
+
+                bot_path, token, env_vars, limits = self.specs[bot_id]
+                self.starting.add(bot_id)
+                try:
+                    success, msg = await self._start_bot(bot_id, bot_path, token, env_vars, None, True, limits)
+                except Exception as e:
+                    # Masalan, bot.log ni ochib bo'lmadi - muvaffaqiyatsiz urinish sifatida hisoblanadi
+                    logging.error(f"Bot {bot_id} ni qayta ishga tushirishda xatolik: {e}")
+                    success, msg = False, str(e)
+                    orphan = self.processes.pop(bot_id, None)
+                    if orphan is not None:  # jarayon yaratilib ulgurgan, kuzatuvsiz qolmasin
+                        self._signal(orphan, force=True)
+                        await asyncio.to_thread(self.cgroups.remove, bot_id)
+                finally:
+                    self.starting.discard(bot_id)
+                if success:
+                    await self._notify(self.on_status, bot_id, "running")
+                    break
+                failures += 1
+                reason = msg
+
+    async def _reap_group(self, bot_id, process):
+        """Asosiy jarayon tugagandan keyin guruhda qolgan bola jarayonlarni o'ldiradi
+        va ularning chiqishi logga yozib bo'linishini kutadi"""
+        self._signal(process, force=True)
+        log_task = self.log_tasks.get(bot_id)
+        if log_task is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(log_task), timeout=STOP_KILL_TIMEOUT)
+            except Exception as e:
+                logging.warning(f"Bot {bot_id} chiqishini yozib bo'lmadi: {e}")
+
+    def _forget_log_task(self, bot_id, task):
+        if self.log_tasks.get(bot_id) is task:
+            del self.log_tasks[bot_id]
+
+    async def _report(self, progress, stage):
+        if progress is None:
+            return
+        try:
+            await progress(stage)
+        except Exception as e:
+            logging.warning(f"Progress xabarini yuborib bo'lmadi: {e}")
+
+    def is_prepared(self, full_path):
+        """Bot oldin muvaffaqiyatli tayyorlanganmi (venv bor va kutubxonalar o'rnatilgan)"""
+        return (os.path.exists(venv_python(os.path.join(full_path, VENV_DIR)))
+                and self.read_install_lock(full_path) is not None)
+
+    def limit_breach(self, bot_id):
+        """Bot cheklovdan oshgani uchun to'xtagan bo'lsa, sababini qaytaradi (aks holda None)"""
+        breach = self.cgroups.breach(bot_id)
+        if breach:
+            return breach
+        spec = self.specs.get(bot_id)
+        if spec:
+            try:
+                if "MemoryError" in tail_lines(self.log_path(spec[0]), 20):
+                    return "xotira chegarasiga yetdi (MemoryError)"
+            except OSError:
+                pass
+        return None
+
+    async def _start_bot(self, bot_id, bot_path, token, env_vars, progress, resume=False, limits=None):
+        full_path = os.path.join(self.base_path, bot_path)
+        prepared = resume and await asyncio.to_thread(self.is_prepared, full_path)
+
+        # 1-3. Fayllarni tayyorlash (disk bilan ishlash thread'da)
+        if prepared:
+            main_file = await asyncio.to_thread(self.find_main_file, full_path)
+        else:
+            await self._report(progress, "📝 Fayllar tayyorlanmoqda...")
+            main_file = await asyncio.to_thread(self.prepare_main_file, full_path, token)
+        if main_file is None:
+            return False, "Hech qanday .py fayl topilmadi"
+
+        # 4. Environment variables
+        env = os.environ.copy()
+        env["BOT_TOKEN"] = token
+        if env_vars:
+            env.update(env_vars)
+
+        log_file_path = os.path.join(full_path, "bot.log")
+        log_file = open(log_file_path, "a", encoding="utf-8")
+        
+        if prepared:
+            log_file.write("♻️ Bot tiklanmoqda, muhit tayyor - tahlil va o'rnatish o'tkazib yuborildi.\n")
+        else:
+            # 5. Avtomatik dependency tahlili va requirements.txt ni yangilash
+            await self._report(progress, "🔍 Kerakli kutubxonalar aniqlanmoqda...")
+            await asyncio.to_thread(self.update_requirements, full_path, log_file)
+
+            # 6. Kutubxonalarni o'rnatish (o'zgarmagan bo'lsa o'tkazib yuboriladi)
+            await self.install_requirements(full_path, log_file, progress)
         
-        # 7. Botni ishga tushirish
-        python_cmd = sys.executable
+        # 7. Botni ishga tushirish (venv bo'lmasa asosiy interpretator bilan)
+        await self._report(progress, "🚀 Bot ishga tushirilmoqda...")
+        python_cmd = os.path.abspath(venv_python(os.path.join(full_path, VENV_DIR)))
+        if not os.path.exists(python_cmd):
+            python_cmd = sys.executable
+        main_name = os.path.basename(main_file)
         
+        # Chiqish pipe orqali o'qilib, hajmi cheklangan aylanuvchi logga yoziladi
         popen_kwargs = {
-            "args": [python_cmd, "-u", "main.py"],
             "env": env,
-            "stdout": log_file,
+            "stdout": asyncio.subprocess.PIPE,
             "stderr": subprocess.STDOUT,
             "cwd": full_path,
-            "text": True,
-            "encoding": "utf-8",
         }
 
         if os.name != 'nt':  # Linux/Unix
-            popen_kwargs["preexec_fn"] = os.setsid
+            popen_kwargs["start_new_session"] = True
+            # Resurs cheklovlari: cgroup v2 (mavjud bo'lsa) va rlimit'lar, jarayon ishga tushgach qo'llanadi
+            limits = limits or BotLimits()
+            cgroup_procs = await asyncio.to_thread(self.cgroups.prepare, bot_id, limits)
         else:  # Windows
             popen_kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
 
         try:
-            log_file.write(f"🚀 Bot ishga tushmoqda: {python_cmd} -u main.py\n")
+            log_file.write(f"🚀 Bot ishga tushmoqda: {python_cmd} -u {main_name}\n")
             log_file.write(f"📂 Working directory: {full_path}\n")
             log_file.write(f"🔑 Token uzunligi: {len(token)}\n")
             log_file.flush()
             
-            process = subprocess.Popen(**popen_kwargs)
+            process = BotProcess(await asyncio.create_subprocess_exec(python_cmd, "-u", main_name, **popen_kwargs))
+            if os.name != 'nt':
+                # Thread'siz: bot cheklovsiz ishlaydigan vaqt iloji boricha qisqa bo'lsin
+                apply_limits(process.pid, limits, cgroup_procs)
             self.processes[bot_id] = process
-            
-            # Bir oz kutish
-            time.sleep(5)
-            
-            # Bot ishlayotganini tekshirish
-            if process.poll() is not None:
-                # Loglarni o'qish
-                with open(log_file_path, 'r', encoding='utf-8') as f:
-                    error_log = f.read()
-                return False, "Bot o'chib qoldi. Loglarni tekshiring."
-            
-            return True, "✅ Bot muvaffaqiyatli ishga tushdi!"
-            
         except Exception as e:
             error_msg = f"❌ Xatolik: {str(e)}"
             log_file.write(f"{error_msg}\n")
-            log_file.close()
             return False, error_msg
+        finally:
+            log_file.close()
 
-    def stop_bot(self, bot_id):
-        if bot_id not in self.processes:
-            return False, "Bot ishlamayapti"
+        ready = asyncio.Event()
+        writer = await asyncio.to_thread(RotatingLogWriter, log_file_path)
+        log_task = asyncio.create_task(pump_output(process.stdout, writer, ready=ready, markers=READY_MARKERS))
+        self.log_tasks[bot_id] = log_task
+        log_task.add_done_callback(lambda task: self._forget_log_task(bot_id, task))
+
+        # Tayyorlikni kutish: jarayon tugashi (xato), chiqishdagi tayyorlik belgisi yoki muddat tugashi
+        exited = asyncio.ensure_future(process.wait())
+        marked = asyncio.ensure_future(ready.wait())
+        try:
+            await asyncio.wait({exited, marked}, timeout=STARTUP_CHECK_SECONDS,
+                               return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            marked.cancel()
+            if not exited.done():
+                exited.cancel()
+        if not exited.done():
+            return True, "✅ Bot muvaffaqiyatli ishga tushdi!"
+
+        self.processes.pop(bot_id, None)
+        await self._reap_group(bot_id, process)
+        breach = await asyncio.to_thread(self.limit_breach, bot_id)
+        await asyncio.to_thread(self.cgroups.remove, bot_id)
+        if breach:
+            return False, f"Bot {breach}. Loglarni tekshiring."
+        return False, "Bot o'chib qoldi. Loglarni tekshiring."
 
-        process = self.processes[bot_id]
+    def process_identity(self, bot_id):
+        """Ishlayotgan bot jarayonining (pid, boshlanish vaqti) juftligi, bo'lmasa (None, None)"""
+        process = self.processes.get(bot_id)
+        if process is None:
+            return None, None
+        return process.pid, process_start_time(process.pid)
+
+    def adopt(self, bot_id, pid, pid_start, bot_path, token, env_vars=None, limits=None):
+        """Boshqaruvchi qayta ishga tushganda hali tirik bot jarayonini qabul qiladi.
+
+        Jarayon PID bo'yicha topiladi va boshlanish vaqti hamda jarayon guruhi
+        solishtiriladi (PID boshqa jarayonga berilgan bo'lishi mumkin). Qabul qilingan
+        jarayon ham kuzatuvchi nazoratiga olinadi. Muvaffaqiyatli bo'lsa True qaytaradi.
+        """
+        if os.name == 'nt' or not pid or pid_start is None or bot_id in self.processes:
+            return False
+        if process_start_time(pid) != pid_start:
+            return False
         try:
-            if os.name != 'nt':  # Linux/Unix
-                os.killpg(os.getpgid(process.pid), signal.SIGTERM)
-            else:  # Windows
+            if os.getpgid(pid) != pid:  # botlar start_new_session bilan ishga tushiriladi
+                return False
+            process = AdoptedProcess(pid)
+        except OSError:
+            return False
+        self.processes[bot_id] = process
+        self.specs[bot_id] = (bot_path, token, dict(env_vars or {}), limits or BotLimits())
+        self._supervise(bot_id)
+        logging.info(f"Bot {bot_id} jarayoni qabul qilindi (PID {pid})")
+        return True
+
+    def _signal(self, process, force=False):
+        """Botning butun jarayon guruhiga SIGTERM (force=True bo'lsa SIGKILL) yuboradi.
+        Guruh allaqachon yo'q bo'lsa hech narsa qilmaydi."""
+        try:
+            if os.name != 'nt':  # Linux/Unix: bot start_new_session bilan guruh boshlig'i
+                os.killpg(process.pid, signal.SIGKILL if force else signal.SIGTERM)
+            elif force:  # Windows
+                process.kill()
+            else:
                 process.terminate()
-                process.wait(timeout=5)
-            
-            del self.processes[bot_id]
-            return True, "✅ Bot to'xtatildi"
-        except Exception as e:
-            # Force kill if normal terminate fails
+        except ProcessLookupError:
+            pass
+
+    async def stop_bot(self, bot_id, grace=STOP_GRACE_SECONDS):
+        """Botni to'xtatadi: SIGTERM, `grace` soniya kutish, kerak bo'lsa SIGKILL va jarayonni reap qilish.
+
+        Jarayon faqat tugagani aniq bo'lgandan keyin processes dan o'chiriladi: to'xtatib
+        bo'lmasa, u kuzatuvda qoladi va to'xtatishni qayta urinish mumkin.
+        """
+        supervised = self._cancel_supervisor(bot_id)
+        process = self.processes.get(bot_id)
+        if process is None:
+            if supervised:
+                # Qayta ishga tushirishni kutayotgan edi
+                return True, "✅ Bot to'xtatildi"
+            return False, "Bot ishlamayapti"
+
+        forced = False
+        try:
+            self._signal(process)
             try:
-                if os.name != 'nt':
-                    os.killpg(os.getpgid(process.pid), signal.SIGKILL)
-                else:
-                    process.kill()
-                del self.processes[bot_id]
-                return True, "⚠️ Bot majburan to'xtatildi"
-            except Exception as e2:
-                return False, f"❌ To'xtatishda xatolik: {str(e2)}"
-
-    def get_logs(self, bot_path, lines=20):
-        log_path = os.path.join(self.base_path, bot_path, "bot.log")
+                await asyncio.wait_for(process.wait(), timeout=grace)
+            except asyncio.TimeoutError:
+                forced = True
+                logging.warning(f"Bot {bot_id} {grace:g} soniyada to'xtamadi, SIGKILL yuborilmoqda")
+            # Guruhda qolgan bola jarayonlar ham tugatiladi
+            if os.name != 'nt' or forced:
+                self._signal(process, force=True)
+            await asyncio.wait_for(process.wait(), timeout=STOP_KILL_TIMEOUT)
+        except Exception as e:
+            error = str(e) or type(e).__name__  # TimeoutError matnsiz bo'ladi
+            logging.error(f"Bot {bot_id} ni to'xtatishda xatolik: {error}")
+            return False, f"❌ To'xtatishda xatolik: {error}"
+
+        if self.processes.get(bot_id) is process:
+            del self.processes[bot_id]
+        await asyncio.to_thread(self.cgroups.remove, bot_id)
+
+        if forced:
+            return True, "⚠️ Bot majburan to'xtatildi"
+        return True, "✅ Bot to'xtatildi"
+
+    async def stop_all(self, bot_ids=None, grace=STOP_GRACE_SECONDS):
+        """Botlarni parallel to'xtatadi (bot_ids berilmasa - hammasini). {bot_id: (muvaffaqiyat, xabar)} qaytaradi."""
+        if bot_ids is None:
+            bot_ids = set(self.processes) | set(self.supervisors)
+        bot_ids = list(bot_ids)
+        results = await asyncio.gather(*(self.stop_bot(bot_id, grace) for bot_id in bot_ids),
+                                       return_exceptions=True)
+        return {bot_id: (r if not isinstance(r, BaseException) else (False, f"❌ {r}"))
+                for bot_id, r in zip(bot_ids, results)}
+
+    def log_path(self, bot_path):
+        return os.path.join(self.base_path, bot_path, "bot.log")
+
+    def get_logs(self, bot_path, lines=20, max_bytes=LOG_TAIL_BYTES):
+        """Logning oxirgi qatorlari. Faqat fayl oxiridagi max_bytes gacha bayt o'qiladi."""
+        log_path = self.log_path(bot_path)
         if not os.path.exists(log_path):
             return "📭 Loglar topilmadi"
         
         try:
-            with open(log_path, "r", encoding="utf-8", errors="ignore") as f:
-                content = f.readlines()
-                if len(content) == 0:
-                    return "📭 Loglar bo'sh"
-                
-                result = "".join(content[-lines:])
-                if len(result) > 4000:  # Telegram xabar chegarasi
-                    result = "..." + result[-4000:]
-                return result
+            if os.path.getsize(log_path) == 0:
+                return "📭 Loglar bo'sh"
+            
+            result = tail_lines(log_path, lines, max_bytes)
+            if len(result) > 4000:  # Telegram xabar chegarasi
+                result = "..." + result[-4000:]
+            return result
         except Exception as e:
             return f"❌ Loglarni o'qishda xatolik: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,285 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import sysconfig
+import tempfile
+import time
+import venv
+import zipfile
+from dependency_detector import IMPORT_TO_PACKAGE
+
+# venv ichida qaysi paketlar ulanganini saqlovchi fayl
+MANIFEST_FILE = ".packages.json"
+
+# Mashhur bot steklari uchun oldindan tayyorlab qo'yiladigan muhit shablonlari
+ENV_TEMPLATES = {
+    "aiogram": [IMPORT_TO_PACKAGE["aiogram"]],
+    "telebot": [IMPORT_TO_PACKAGE["telebot"]],
+    "telebot_requests": [IMPORT_TO_PACKAGE["telebot"], IMPORT_TO_PACKAGE["requests"]],
+}
+# Shablon shu muddatdan eski bo'lsa qayta hal qilinadi (soniya)
+TEMPLATE_MAX_AGE = int(os.getenv("ENV_TEMPLATE_MAX_AGE", str(7 * 24 * 3600)))
+
+def normalize_name(name):
+    """Paket nomini PEP 503 bo'yicha normallashtiradi"""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+def normalize_requirements(req_file):
+    """requirements.txt ni taqqoslash uchun normal ko'rinishga keltiradi (izohsiz, tartiblangan)"""
+    requirements = set()
+    with open(req_file, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            line = line.split(" #")[0].strip()
+            if not line or line.startswith("#"):
+                continue
+            # Paket nomini PEP 503 bo'yicha normallashtiramiz, versiya shartini saqlaymiz
+            match = re.match(r"^([A-Za-z0-9][A-Za-z0-9._-]*)(.*)$", line)
+            if match:
+                name = normalize_name(match.group(1))
+                line = name + match.group(2).replace(" ", "")
+            requirements.add(line)
+    return sorted(requirements)
+
+def is_pinned(requirement):
+    """Normallashtirilgan talab aniq bitta versiyaga qotirilganmi (name==1.2.3)"""
+    return re.fullmatch(r"[a-z0-9][a-z0-9-]*(\[[^\]]*\])?===?[^*,;<>=!~]+", requirement) is not None
+
+def venv_python(venv_dir):
+    """venv ichidagi python interpretator yo'li"""
+    if os.name == 'nt':
+        return os.path.join(venv_dir, "Scripts", "python.exe")
+    return os.path.join(venv_dir, "bin", "python")
+
+def venv_site_packages(venv_dir):
+    """venv ichidagi site-packages papkasi"""
+    return sysconfig.get_path("purelib", vars={"base": venv_dir, "platbase": venv_dir})
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def link_tree(src, dst):
+    """src ni dst ga symlink qiladi. Ikki paket bitta papkani (namespace package)
+    ulashsa, papka haqiqiy papkaga aylantirilib ichidagilar alohida ulanadi."""
+    if not os.path.lexists(dst):
+        try:
+            os.symlink(src, dst, target_is_directory=os.path.isdir(src))
+        except OSError:
+            # Symlink qo'llab-quvvatlanmasa (masalan, Windows) nusxa olamiz
+            if os.path.isdir(src):
+                shutil.copytree(src, dst)
+            else:
+                shutil.copy2(src, dst)
+        return
+
+    if not (os.path.isdir(src) and os.path.isdir(dst)):
+        return  # Fayl to'qnashuvi: birinchi ulangan paket ustun
+
+    if os.path.islink(dst):
+        other = os.readlink(dst)
+        os.unlink(dst)
+        os.mkdir(dst)
+        for name in os.listdir(other):
+            link_tree(os.path.join(other, name), os.path.join(dst, name))
+    for name in os.listdir(src):
+        link_tree(os.path.join(src, name), os.path.join(dst, name))
+
+class PackageStore:
+    """Barcha botlar uchun umumiy, kontent-manzilli paketlar ombori.
+
+    Har bir wheel bir marta (sha256 bo'yicha) `packages/<hash>` ga ochiladi, botlarning
+    venv'lari esa faqat symlink'lardan iborat bo'ladi.
+    """
+
+    def __init__(self, root, pip_timeout=180):
+        self.root = os.path.abspath(root)
+        self.wheels_dir = os.path.join(self.root, "wheels")
+        self.packages_dir = os.path.join(self.root, "packages")
+        self.templates_dir = os.path.join(self.root, "templates")
+        self.pip_timeout = pip_timeout
+        self.templates = None  # nomi: (talablar to'plami, paketlar xeshlari)
+        os.makedirs(self.wheels_dir, exist_ok=True)
+        os.makedirs(self.packages_dir, exist_ok=True)
+        os.makedirs(self.templates_dir, exist_ok=True)
+
+    def ensure_venv(self, venv_dir):
+        """pip'siz venv yaratadi. Yangi yaratilgan bo'lsa True qaytaradi."""
+        if os.path.exists(venv_python(venv_dir)):
+            return False
+        venv.EnvBuilder(with_pip=False, symlinks=(os.name != 'nt'), clear=True).create(venv_dir)
+        return True
+
+    async def _pip_wheel(self, req_file, wheel_dir, offline):
+        args = [
+            sys.executable, "-m", "pip", "wheel", "-q",
+            "-r", os.path.abspath(req_file),
+            "--wheel-dir", wheel_dir,
+            "--find-links", self.wheels_dir,
+        ]
+        if offline:
+            args.append("--no-index")
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, stderr = await asyncio.wait_for(proc.communicate(), timeout=self.pip_timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise TimeoutError(f"pip {self.pip_timeout} soniyada tugamadi")
+        return proc.returncode == 0, stderr.decode("utf-8", errors="ignore")
+
+    async def resolve(self, req_file, offline=None):
+        """requirements.txt ni to'liq (bog'liqliklari bilan) hal qiladi va omborga qo'shadi.
+
+        Barcha talablar aniq versiyaga qotirilgan bo'lsa, avval faqat ombordagi wheel'lar
+        bilan (internetsiz) urinib ko'riladi. Versiyasiz talablar doim internetdan hal
+        qilinadi, aks holda omborga birinchi tushgan eski versiya (xavfsizlik tuzatishlarisiz)
+        abadiy ishlatilib qolardi. offline=False bo'lsa internetsiz urinish o'tkazib
+        yuboriladi (masalan, shablonni yangilashda). Paketlar xeshlari ro'yxatini qaytaradi.
+        """
+        requirements = await asyncio.to_thread(normalize_requirements, req_file)
+        wheel_dir = tempfile.mkdtemp(prefix="resolve-", dir=self.root)
+        try:
+            ok = False
+            if offline is None:
+                offline = bool(requirements) and all(is_pinned(r) for r in requirements)
+            if offline:
+                ok, _ = await self._pip_wheel(req_file, wheel_dir, offline=True)
+            if not ok:
+                shutil.rmtree(wheel_dir, ignore_errors=True)
+                os.makedirs(wheel_dir)
+                ok, stderr = await self._pip_wheel(req_file, wheel_dir, offline=False)
+                if not ok:
+                    raise RuntimeError(stderr.strip() or "pip wheel xatolik bilan tugadi")
+            return await asyncio.to_thread(self._import_wheels, wheel_dir)
+        finally:
+            shutil.rmtree(wheel_dir, ignore_errors=True)
+
+    def _import_wheels(self, wheel_dir):
+        hashes = []
+        for name in sorted(os.listdir(wheel_dir)):
+            if not name.endswith(".whl"):
+                continue
+            wheel_path = os.path.join(wheel_dir, name)
+            package_hash = file_sha256(wheel_path)
+            self._unpack(wheel_path, package_hash)
+
+            # Keyingi hal qilishlar internetsiz topishi uchun wheel'ni saqlab qo'yamiz
+            stored_wheel = os.path.join(self.wheels_dir, name)
+            if not os.path.exists(stored_wheel):
+                os.replace(wheel_path, stored_wheel)
+            hashes.append(package_hash)
+        return hashes
+
+    def _unpack(self, wheel_path, package_hash):
+        target = os.path.join(self.packages_dir, package_hash)
+        if os.path.exists(target):
+            return
+        tmp_dir = tempfile.mkdtemp(prefix="unpack-", dir=self.packages_dir)
+        try:
+            with zipfile.ZipFile(wheel_path) as wheel:
+                wheel.extractall(tmp_dir)
+            # Parallel ochilgan bo'lsa, birinchisi qoladi
+            os.rename(tmp_dir, target)
+        except OSError:
+            if not os.path.exists(target):
+                raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _package_entries(self, package_hash):
+        """Paketning site-packages ga ulanadigan elementlari"""
+        package_dir = os.path.join(self.packages_dir, package_hash)
+        for name in os.listdir(package_dir):
+            path = os.path.join(package_dir, name)
+            if name.endswith(".data") and os.path.isdir(path):
+                # <dist>.data/purelib va platlib ham site-packages ga tushadi
+                for scheme in ("purelib", "platlib"):
+                    scheme_dir = os.path.join(path, scheme)
+                    if os.path.isdir(scheme_dir):
+                        for sub in os.listdir(scheme_dir):
+                            yield sub, os.path.join(scheme_dir, sub)
+                continue
+            yield name, path
+
+    def link(self, venv_dir, hashes):
+        """venv site-packages ni berilgan paketlar to'plamiga moslab qayta quradi"""
+        site_packages = venv_site_packages(venv_dir)
+        shutil.rmtree(site_packages, ignore_errors=True)
+        os.makedirs(site_packages)
+        for package_hash in hashes:
+            for name, path in self._package_entries(package_hash):
+                link_tree(path, os.path.join(site_packages, name))
+        with open(os.path.join(venv_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(sorted(hashes), f)
+        logging.info(f"{venv_dir}: {len(hashes)} ta paket ulandi")
+
+    def _template_path(self, name):
+        return os.path.join(self.templates_dir, f"{name}.json")
+
+    def _load_templates(self):
+        templates = {}
+        for name in ENV_TEMPLATES:
+            try:
+                with open(self._template_path(name), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                templates[name] = (frozenset(data["requirements"]), data["packages"])
+            except (OSError, ValueError, KeyError):
+                continue
+        self.templates = templates
+
+    async def warm_templates(self):
+        """Yo'q yoki eskirgan shablonlarni fonda hal qilib omborga qo'shadi"""
+        for name, requirements in ENV_TEMPLATES.items():
+            path = self._template_path(name)
+            try:
+                if time.time() - os.path.getmtime(path) < TEMPLATE_MAX_AGE:
+                    continue
+            except OSError:
+                pass
+
+            fd, req_file = tempfile.mkstemp(prefix="template-", suffix=".txt", dir=self.root)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write("\n".join(requirements) + "\n")
+                # Eskirgan shablon yangi versiyalarga o'tishi uchun doim internetdan hal qilinadi
+                hashes = await self.resolve(req_file, offline=False)
+                data = {"requirements": normalize_requirements(req_file), "packages": hashes}
+                with open(path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(data, f)
+                os.replace(path + ".tmp", path)
+                logging.info(f"Muhit shabloni tayyor: {name} ({len(hashes)} ta paket)")
+            except Exception as e:
+                logging.error(f"Muhit shablonini tayyorlab bo'lmadi ({name}): {e}")
+            finally:
+                os.remove(req_file)
+        self._load_templates()
+
+    def match_template(self, requirements):
+        """Talablarga mos keladigan eng kichik shablon paketlarini qaytaradi (yoki None).
+
+        Shablon faqat barcha talablar versiyasiz paket nomlari bo'lsa va ularning
+        hammasi shablonda mavjud bo'lsa ishlatiladi.
+        """
+        if self.templates is None:
+            self._load_templates()
+        wanted = set(requirements)
+        if not all(re.fullmatch(r"[a-z0-9][a-z0-9-]*", r) for r in wanted):
+            return None
+        best = None
+        for template_requirements, hashes in self.templates.values():
+            if wanted <= template_requirements:
+                if best is None or len(hashes) < len(best):
+                    best = hashes
+        return best
@@ -0,0 +1,205 @@
+import logging
+import os
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+# Boshqa jarayonning rlimit'larini o'zgartirish (resource.prlimit) faqat Linux'da bor
+HAS_PRLIMIT = hasattr(resource, "prlimit")
+
+# Bot uchun standart cheklovlar (bazada qiymat berilmagan bo'lsa). 0 - cheklanmagan.
+DEFAULT_MEMORY_MB = int(os.getenv("BOT_MEMORY_MB", "512"))
+DEFAULT_CPU_PERCENT = int(os.getenv("BOT_CPU_PERCENT", "100"))  # 100 - bitta yadro
+DEFAULT_MAX_FILES = int(os.getenv("BOT_MAX_FILES", "1024"))
+DEFAULT_MAX_PROCS = int(os.getenv("BOT_MAX_PROCS", "64"))
+# Botlarning cgroup'lari shu papka ichida yaratiladi (cgroup v2)
+CGROUP_ROOT = os.getenv("BOT_CGROUP_ROOT", "/sys/fs/cgroup/hosting_bots")
+CGROUP_CPU_PERIOD = 100000  # mikrosoniya
+# cgroup'ni o'chirishda ichidagi jarayonlar tugashini kutish urinishlari (har biri 0.05 soniya)
+CGROUP_REMOVE_RETRIES = 40
+# cgroup bo'lmaganda xotirani RLIMIT_AS bilan cheklash (faqat yoqilgan bo'lsa). U virtual
+# xotirani o'lchaydi: ko'p thread'li botlar (glibc arenalari, numpy/OpenBLAS) kam RSS bilan ham
+# chegaraga yetib MemoryError olishi mumkin, shuning uchun standart holatda o'chirilgan.
+RLIMIT_AS_FALLBACK = os.getenv("BOT_RLIMIT_AS", "0") == "1"
+# RLIMIT_AS odatda RSS dan ancha katta bo'ladi, shuning uchun chegara shu koeffitsiyentga ko'paytiriladi.
+RLIMIT_AS_FACTOR = int(os.getenv("BOT_RLIMIT_AS_FACTOR", "4"))
+
+class BotLimits:
+    """Bitta bot uchun resurs cheklovlari"""
+    __slots__ = ("memory_mb", "cpu_percent", "max_files", "max_procs")
+
+    FIELDS = {
+        "memory_mb": "💾 Xotira (MB)",
+        "cpu_percent": "⚙️ CPU (%)",
+        "max_files": "📄 Ochiq fayllar",
+        "max_procs": "🧵 Jarayonlar",
+    }
+
+    def __init__(self, memory_mb=None, cpu_percent=None, max_files=None, max_procs=None):
+        self.memory_mb = DEFAULT_MEMORY_MB if memory_mb is None else memory_mb
+        self.cpu_percent = DEFAULT_CPU_PERCENT if cpu_percent is None else cpu_percent
+        self.max_files = DEFAULT_MAX_FILES if max_files is None else max_files
+        self.max_procs = DEFAULT_MAX_PROCS if max_procs is None else max_procs
+
+    @classmethod
+    def from_record(cls, bot_data):
+        return cls(bot_data.memory_mb, bot_data.cpu_percent, bot_data.max_files, bot_data.max_procs)
+
+    def describe(self, cgroups=True):
+        """Cheklovlar matni. cgroups=False bo'lsa, rlimit'lar bilan qo'llab bo'lmaydigan
+        cheklovlar shunday deb ko'rsatiladi."""
+        enforced = enforced_fields(cgroups)
+        lines = []
+        for field, label in self.FIELDS.items():
+            value = getattr(self, field)
+            if not value:
+                text = "cheklanmagan"
+            elif field not in enforced:
+                text = f"{value} (qo'llanmaydi: cgroup v2 yo'q)"
+            elif field == "memory_mb" and not cgroups:
+                text = f"{value} (virtual xotira {value * RLIMIT_AS_FACTOR} MB gacha, RLIMIT_AS)"
+            else:
+                text = str(value)
+            lines.append(f"{label}: {text}")
+        return "\n".join(lines)
+
+def enforced_fields(cgroups):
+    """Haqiqatda qo'llanadigan cheklovlar. cgroup'siz CPU va jarayonlar soni cheklanmaydi,
+    xotira esa faqat BOT_RLIMIT_AS=1 bo'lsa cheklanadi."""
+    if cgroups:
+        return set(BotLimits.FIELDS)
+    if HAS_PRLIMIT:
+        return {"memory_mb", "max_files"} if RLIMIT_AS_FALLBACK else {"max_files"}
+    return set()
+
+class CgroupLimiter:
+    """Har bir bot uchun cgroup v2 (`bot_<id>`) yaratib memory.max, cpu.max va pids.max ni yozadi.
+
+    cgroup v2 bo'lmasa yoki unga yozish huquqi bo'lmasa `available` False bo'ladi va
+    faqat rlimit'lar ishlatiladi.
+    """
+
+    def __init__(self, root=CGROUP_ROOT):
+        self.root = root
+        self.oom_kills = {}  # bot_id: ishga tushgandagi oom_kill hisobi
+        self.available = self._setup()
+
+    def _setup(self):
+        if os.name == 'nt' or not os.path.exists(os.path.join(os.path.dirname(self.root), "cgroup.controllers")):
+            return False
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, "cgroup.controllers"), "r") as f:
+                controllers = f.read().split()
+            wanted = [c for c in ("memory", "cpu", "pids") if c in controllers]
+            if "memory" not in wanted:
+                logging.warning(f"{self.root} da memory kontrolleri yoqilmagan, faqat rlimit'lar qo'llanadi")
+                return False
+            with open(os.path.join(self.root, "cgroup.subtree_control"), "w") as f:
+                f.write(" ".join(f"+{c}" for c in wanted))
+            return True
+        except OSError as e:
+            logging.warning(f"cgroup v2 ishlatib bo'lmaydi, faqat rlimit'lar qo'llanadi: {e}")
+            return False
+
+    def path(self, bot_id):
+        return os.path.join(self.root, f"bot_{bot_id}")
+
+    def _write(self, bot_id, name, value):
+        try:
+            with open(os.path.join(self.path(bot_id), name), "w") as f:
+                f.write(str(value))
+        except OSError as e:
+            logging.warning(f"Bot {bot_id}: {name} yozilmadi: {e}")
+
+    def _read_events(self, bot_id, name):
+        try:
+            with open(os.path.join(self.path(bot_id), name), "r") as f:
+                return dict((k, int(v)) for k, v in (line.split() for line in f if line.strip()))
+        except (OSError, ValueError):
+            return {}
+
+    def prepare(self, bot_id, limits):
+        """Bot cgroup'ini yaratadi va cheklovlarni yozadi. cgroup.procs yo'lini (yoki None) qaytaradi."""
+        if not self.available:
+            return None
+        try:
+            os.makedirs(self.path(bot_id), exist_ok=True)
+        except OSError as e:
+            logging.warning(f"Bot {bot_id} uchun cgroup yaratilmadi: {e}")
+            return None
+        self._write(bot_id, "memory.max", limits.memory_mb * 1024 * 1024 if limits.memory_mb else "max")
+        self._write(bot_id, "memory.swap.max", 0 if limits.memory_mb else "max")
+        if limits.cpu_percent:
+            self._write(bot_id, "cpu.max", f"{limits.cpu_percent * CGROUP_CPU_PERIOD // 100} {CGROUP_CPU_PERIOD}")
+        else:
+            self._write(bot_id, "cpu.max", f"max {CGROUP_CPU_PERIOD}")
+        self._write(bot_id, "pids.max", limits.max_procs or "max")
+        self.oom_kills[bot_id] = self._read_events(bot_id, "memory.events").get("oom_kill", 0)
+        return os.path.join(self.path(bot_id), "cgroup.procs")
+
+    def breach(self, bot_id):
+        """Oxirgi ishga tushirishdan beri xotira cheklovi tufayli jarayon o'ldirilganmi"""
+        if not self.available:
+            return None
+        kills = self._read_events(bot_id, "memory.events").get("oom_kill", 0)
+        if kills > self.oom_kills.get(bot_id, 0):
+            self.oom_kills[bot_id] = kills
+            return "xotira chegarasidan oshgani uchun to'xtatildi (oom_kill)"
+        return None
+
+    def remove(self, bot_id):
+        """Bot cgroup'ini o'chiradi. Unda qolgan jarayonlar (masalan, o'z sessiyasini ochib
+        jarayon guruhidan chiqib ketganlar) cgroup.kill orqali o'ldiriladi (Linux 5.14+)."""
+        self.oom_kills.pop(bot_id, None)
+        path = self.path(bot_id)
+        if not os.path.isdir(path):
+            return
+        try:
+            with open(os.path.join(path, "cgroup.kill"), "w") as f:
+                f.write("1")
+        except OSError:
+            pass  # eski yadro
+        for _ in range(CGROUP_REMOVE_RETRIES):
+            try:
+                os.rmdir(path)
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                time.sleep(0.05)  # jarayonlar hali tugamagan
+        logging.warning(f"Bot {bot_id} cgroup'i o'chirilmadi: ichida hali jarayon bor")
+
+def apply_limits(pid, limits, cgroup_procs=None):
+    """Ishga tushgan bot jarayoniga cheklovlarni ota jarayondan qo'llaydi: PID cgroup.procs ga
+    yoziladi, rlimit'lar resource.prlimit bilan o'rnatiladi.
+
+    preexec_fn ishlatilmaydi: ko'p thread'li jarayonda fork va exec orasida Python kodi
+    bajarish xavfli. Bot interpretatori ishga tushayotgan qisqa vaqtda cheklovsiz bo'ladi,
+    lekin u yaratgan bola jarayonlar cheklovlarni meros qilib oladi.
+    """
+    in_cgroup = False
+    if cgroup_procs:
+        try:
+            with open(cgroup_procs, "w") as f:
+                f.write(str(pid))
+            in_cgroup = True
+        except OSError as e:
+            logging.warning(f"PID {pid} cgroup'ga qo'shilmadi, faqat rlimit'lar qo'llanadi: {e}")
+    if not HAS_PRLIMIT:
+        return
+    try:
+        if limits.max_files:
+            _set_rlimit(pid, resource.RLIMIT_NOFILE, limits.max_files)
+        if limits.memory_mb and not in_cgroup and RLIMIT_AS_FALLBACK:
+            _set_rlimit(pid, resource.RLIMIT_AS, limits.memory_mb * 1024 * 1024 * RLIMIT_AS_FACTOR)
+    except OSError as e:
+        logging.warning(f"PID {pid} uchun rlimit o'rnatilmadi: {e}")
+
+def _set_rlimit(pid, kind, value):
+    _, hard = resource.prlimit(pid, kind)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    resource.prlimit(pid, kind, (value, value))
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import os
+import time
+from array import array
+
+# Namuna olish oralig'i (soniya)
+SAMPLE_INTERVAL = float(os.getenv("BOT_SAMPLE_INTERVAL", "5"))
+# Aniq namunalar soni (standart: 5 soniyalik 120 ta = 10 daqiqa)
+FINE_SAMPLES = int(os.getenv("BOT_SAMPLE_FINE", "120"))
+# Shuncha aniq namuna bitta qo'pol namunaga yig'iladi va qo'pol namunalar soni
+# (standart: 1 daqiqalik 1440 ta = 1 sutka)
+COARSE_EVERY = int(os.getenv("BOT_SAMPLE_COARSE_EVERY", "12"))
+COARSE_SAMPLES = int(os.getenv("BOT_SAMPLE_COARSE", "1440"))
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+class SeriesRing:
+    """Vaqt qatorlari uchun ixcham halqa bufer: vaqt, CPU (%), RSS (KiB), I/O (KiB)"""
+
+    def __init__(self, size):
+        self.size = size
+        self.ts = array("d", bytes(8 * size))
+        self.cpu = array("f", bytes(4 * size))
+        self.rss = array("L", bytes(array("L").itemsize * size))
+        self.io = array("L", bytes(array("L").itemsize * size))
+        self.head = 0  # keyingi yoziladigan joy
+        self.count = 0
+
+    def append(self, ts, cpu, rss, io):
+        i = self.head
+        self.ts[i], self.cpu[i], self.rss[i], self.io[i] = ts, cpu, rss, io
+        self.head = (i + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def latest(self):
+        if not self.count:
+            return None
+        i = (self.head - 1) % self.size
+        return self.ts[i], self.cpu[i], self.rss[i], self.io[i]
+
+    def items(self):
+        """Namunalar eskisidan yangisiga"""
+        start = (self.head - self.count) % self.size
+        for k in range(self.count):
+            i = (start + k) % self.size
+            yield self.ts[i], self.cpu[i], self.rss[i], self.io[i]
+
+class BotSeries:
+    """Bitta botning namunalari: aniq va qo'pol (o'rtacha CPU, maksimal RSS) qatorlar"""
+
+    def __init__(self, pgid):
+        self.pgid = pgid
+        self.fine = SeriesRing(FINE_SAMPLES)
+        self.coarse = SeriesRing(COARSE_SAMPLES)
+        self.ticks = None  # oxirgi namunadagi CPU tick'lari yig'indisi
+        self.sampled_at = None
+        self.peak_cpu = 0.0
+        self.peak_rss = 0
+        self._bucket = []
+
+    def add(self, now, ticks, rss, io):
+        if self.ticks is None:
+            cpu = 0.0  # birinchi namunada farq hisoblab bo'lmaydi
+        else:
+            # Guruhdagi bola jarayon tugasa yig'indi kamayishi mumkin
+            cpu = max(0, ticks - self.ticks) / CLOCK_TICKS / max(now - self.sampled_at, 1e-6) * 100
+        self.ticks, self.sampled_at = ticks, now
+        self.fine.append(time.time(), cpu, rss, io)
+        self.peak_cpu = max(self.peak_cpu, cpu)
+        self.peak_rss = max(self.peak_rss, rss)
+
+        self._bucket.append((cpu, rss, io))
+        if len(self._bucket) >= COARSE_EVERY:
+            bucket, self._bucket = self._bucket, []
+            self.coarse.append(time.time(), sum(c for c, _, _ in bucket) / len(bucket),
+                               max(r for _, r, _ in bucket), bucket[-1][2])
+
+    def average_cpu(self):
+        """Saqlangan butun davr (qo'pol qator, bo'lmasa aniq qator) bo'yicha o'rtacha CPU"""
+        ring = self.coarse if self.coarse.count else self.fine
+        if not ring.count:
+            return 0.0
+        return sum(cpu for _, cpu, _, _ in ring.items()) / ring.count
+
+def read_process_groups(pgids):
+    """/proc ni bir marta aylanib, berilgan jarayon guruhlari bo'yicha
+    {pgid: (CPU tick'lari, RSS KiB, I/O KiB)} qaytaradi"""
+    totals = {}
+    try:
+        pids = [name for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return totals
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", "r") as f:
+                # 2-maydon (comm) ichida bo'sh joy bo'lishi mumkin
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        pgid = int(fields[2])
+        if pgid not in pgids:
+            continue
+        ticks = int(fields[11]) + int(fields[12])  # utime + stime
+        try:
+            with open(f"/proc/{pid}/statm", "r") as f:
+                rss = int(f.read().split()[1]) * PAGE_SIZE // 1024
+        except (OSError, IndexError, ValueError):
+            rss = 0
+        io = 0
+        try:
+            with open(f"/proc/{pid}/io", "r") as f:
+                for line in f:
+                    if line.startswith(("read_bytes:", "write_bytes:")):
+                        io += int(line.split()[1]) // 1024
+        except (OSError, ValueError):
+            pass  # boshqa foydalanuvchi jarayoni yoki yadro qo'llab-quvvatlamaydi
+        t, r, i = totals.get(pgid, (0, 0, 0))
+        totals[pgid] = (t + ticks, r + rss, i + io)
+    return totals
+
+class ResourceSampler:
+    """BotManager.processes dagi har bir bot jarayon guruhining CPU/RSS/IO sini
+    SAMPLE_INTERVAL da bir o'lchab boradi. Faqat Linux (/proc) da ishlaydi."""
+
+    def __init__(self, manager, interval=SAMPLE_INTERVAL):
+        self.manager = manager
+        self.interval = interval
+        self.series = {}  # bot_id: BotSeries
+
+    @property
+    def available(self):
+        return os.path.isdir("/proc/self")
+
+    async def sample_once(self):
+        groups = {bot_id: process.pid for bot_id, process in self.manager.processes.items()}
+        # To'xtagan botlarning qatorlari o'chiriladi
+        for bot_id in list(self.series):
+            if bot_id not in groups:
+                del self.series[bot_id]
+        # /proc ni o'qish thread'da, natijalarni yozish event loop'da
+        totals = await asyncio.to_thread(read_process_groups, set(groups.values()))
+        now = time.monotonic()
+        for bot_id, pgid in groups.items():
+            if pgid not in totals:
+                continue
+            series = self.series.get(bot_id)
+            if series is None or series.pgid != pgid:
+                # Bot qayta ishga tushgan - qator yangidan boshlanadi
+                series = self.series[bot_id] = BotSeries(pgid)
+            ticks, rss, io = totals[pgid]
+            series.add(now, ticks, rss, io)
+
+    async def run(self):
+        if not self.available:
+            logging.info("/proc topilmadi, resurs namunalari olinmaydi")
+            return
+        while True:
+            try:
+                await self.sample_once()
+            except Exception as e:
+                logging.error(f"Resurs namunasini olishda xatolik: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self, bot_id):
+        """Joriy va eng yuqori CPU (%) / RSS (MiB), ma'lumot bo'lmasa None"""
+        series = self.series.get(bot_id)
+        latest = series.fine.latest() if series else None
+        if latest is None:
+            return None
+        _, cpu, rss, io = latest
+        return {
+            "cpu": cpu,
+            "rss_mb": rss / 1024,
+            "peak_cpu": series.peak_cpu,
+            "peak_rss_mb": series.peak_rss / 1024,
+            "io_mb": io / 1024,
+        }
+
+    def top(self, limit=10):
+        """O'rtacha CPU bo'yicha eng ko'p resurs ishlatayotgan botlar: [(bot_id, o'rtacha CPU, eng yuqori RSS MiB)]"""
+        ranked = [(bot_id, series.average_cpu(), series.peak_rss / 1024)
+                  for bot_id, series in self.series.items()]
+        ranked.sort(key=lambda item: (item[1], item[2]), reverse=True)
+        return ranked[:limit]